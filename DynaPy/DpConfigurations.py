@@ -4,16 +4,43 @@ class Configurations(object):
                  dampingRatio=0.02,
                  liquidSpecificMass=998.2071, kineticViscosity=1.003e-6, gravity=9.807, pipeRoughness=0.0015e-3,
                  dmfDiscretizationPoints=200, dmfUpperLimitFactor=2,
-                 nonLinearAnalysis=True, structureType='Shear Building'):
+                 nonLinearAnalysis=True, structureType='Shear Building', holdOrder=1,
+                 modalMassParticipation=0.95, dmfMethod='Frequency Response',
+                 dmfWorkers=None, dmfAdaptive=False, dmfTolerance=1e-3,
+                 dmfSteadyStateTolerance=1e-3, dmfMaxDuration=40., dmfWarmStart=False,
+                 dmfHarmonics=3, nonLinearMethod='Time Stepping', equivalentDampingTolerance=1e-3,
+                 excitationCacheSize=64e6):
         """
         :param method: str - ODE solution method to be used by DynaSolver.ODESolver()
         :param timeStep: float - time step between iterations (s)
-        :param initialDisplacement: float - initial displacement of all stories
-        :param initialVelocity: float - initial velocity of all stories
+        :param initialDisplacement: float - initial displacement of all stories (or np.ndarray, one for each DOF)
+        :param initialVelocity: float - initial velocity of all stories (or np.ndarray, one for each DOF)
         :param dampingRatio: float - Relative damping ratio of the building
         :param liquidSpecificMass: float - Tlcd liquid specific mass (kg/m**3)
         :param kineticViscosity: float - Tlcd liquid kinetic viscosity (m**2/s)
         :param gravity: float - Gravity acceleration (m/s**2)
+        :param holdOrder: int - Force interpolation between time steps used by the Matrix Exponential Method (0 for
+        zero-order hold, 1 for first-order hold)
+        :param modalMassParticipation: float - Fraction of the total mass captured by the modes kept in the Modal
+        Superposition Method
+        :param dmfMethod: str - 'Frequency Response' for the steady-state DMF of linear systems and of nonlinear ones
+        whose nonLinearMethod is 'Equivalent Linearization' (with 'Time Stepping' they fall back to 'Time History'),
+        'Harmonic Balance' for the steady-state DMF of linear and nonlinear systems or 'Time History' for the peak of a
+        time integration at each frequency, linear or nonlinear
+        :param dmfWorkers: int - Number of processes of the time integration DMF sweep (all the CPUs if None)
+        :param dmfAdaptive: bool - Refines the DMF sweep around peaks and curved regions instead of sampling it
+        uniformly, using at most dmfDiscretizationPoints frequencies
+        :param dmfTolerance: float - Relative tolerance on the DMF peak heights and frequencies of the adaptive sweep
+        :param dmfSteadyStateTolerance: float - Relative change of the peak displacement between excitation cycles
+        below which a DMF time integration is at steady state and stops (None runs the whole dmfMaxDuration)
+        :param dmfMaxDuration: float - Duration of the excitation and analysis of each DMF time integration (s)
+        :param dmfWarmStart: bool - Starts each DMF time integration from the steady state of the previous frequency
+        :param dmfHarmonics: int - Number of odd harmonics of the Harmonic Balance DMF
+        :param nonLinearMethod: str - 'Time Stepping' to update the nonlinear TLCD damping along the analysis or
+        'Equivalent Linearization' to replace it by an iteratively computed equivalent linear damping coefficient
+        :param equivalentDampingTolerance: float - Relative change of the equivalent damping coefficient at convergence
+        :param excitationCacheSize: float - Memory cap of the resampled General Excitation records kept for later
+        analyses (bytes)
         :return: None
         """
         self.method = method
@@ -29,3 +56,16 @@ class Configurations(object):
         self.dmfUpperLimitFactor = dmfUpperLimitFactor
         self.nonLinearAnalysis = nonLinearAnalysis
         self.structureType = structureType
+        self.holdOrder = holdOrder
+        self.modalMassParticipation = modalMassParticipation
+        self.dmfMethod = dmfMethod
+        self.dmfWorkers = dmfWorkers
+        self.dmfAdaptive = dmfAdaptive
+        self.dmfTolerance = dmfTolerance
+        self.dmfSteadyStateTolerance = dmfSteadyStateTolerance
+        self.dmfMaxDuration = dmfMaxDuration
+        self.dmfWarmStart = dmfWarmStart
+        self.dmfHarmonics = dmfHarmonics
+        self.nonLinearMethod = nonLinearMethod
+        self.equivalentDampingTolerance = equivalentDampingTolerance
+        self.excitationCacheSize = excitationCacheSize
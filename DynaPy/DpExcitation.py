@@ -1,4 +1,9 @@
+import os
+from zipfile import BadZipFile
+
+import numpy as np
 from numpy import sqrt
+from .DpRecordCache import content_hash
 
 
 class Excitation(object):
@@ -37,6 +42,9 @@ class Excitation(object):
             self.anlyDuration = t[-1]
             self.fileName = fileName
 
+            # Key of the resampled record in DynaSolver.resampledRecordCache, hashed once per record
+            self.recordHash = content_hash(t, a)
+
         for (i, j) in kwargs.items():
             exec('self.{} = {}'.format(i, j))
 
@@ -51,3 +59,42 @@ class Excitation(object):
             self.frequency = self.frequencyInput * sqrt(stiffness / mass)
         else:
             self.frequency = self.frequencyInput
+
+
+def load_excitation_record(fileName, cache=True):
+    """ Function that reads an excitation record file, made of a 'unit: g' or 'unit: m/s2' line, the number of samples
+    and one 't, a' line per sample, parsing all the samples at once. A binary copy of the record is written next to the
+    file (fileName + '.npz') and read instead of the text while the path, modification time and size of the file stay
+    the same.
+
+    :param fileName: str - Path of the record file.
+    :param cache: bool - Whether the binary copy is used and written.
+    :return: tuple - Unit of the acceleration ('g' or 'm/s2'), np.ndarray of times and np.ndarray of accelerations.
+    """
+    path = os.path.abspath(fileName)
+    status = os.stat(path)
+    sidecar = path + '.npz'
+
+    if cache:
+        try:
+            with np.load(sidecar) as data:
+                if (str(data['path']) == path and int(data['mtime']) == status.st_mtime_ns and
+                        int(data['size']) == status.st_size):
+                    return str(data['unit']), data['t'], data['a']
+        except (OSError, KeyError, ValueError, BadZipFile):
+            pass
+
+    with open(path, 'r', encoding='utf-8') as file:
+        unit = file.readline().strip()
+        unit = unit[len('unit:'):].strip() if unit.startswith('unit:') else unit
+        rows = int(file.readline())
+        record = np.loadtxt(file, delimiter=',', max_rows=rows, ndmin=2).reshape(-1, 2)
+    t = np.ascontiguousarray(record[:, 0])
+    a = np.ascontiguousarray(record[:, 1])
+
+    if cache:
+        try:
+            np.savez(sidecar, path=path, mtime=status.st_mtime_ns, size=status.st_size, unit=unit, t=t, a=a)
+        except OSError:
+            pass
+    return unit, t, a
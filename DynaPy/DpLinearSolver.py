@@ -0,0 +1,302 @@
+import numpy as np
+from scipy.linalg import LinAlgError, cho_factor, cho_solve, lu_factor, lu_solve
+from scipy.linalg.blas import dgbmv
+from scipy.linalg.lapack import dgbtrf, dgbtrs
+from scipy.sparse import csc_matrix, csr_matrix, issparse
+from scipy.sparse.linalg import splu
+
+# Below this number of DOFs the dense LAPACK routines are faster than the structured ones
+STRUCTURED_SIZE = 32
+
+
+class LinearSolver(object):
+    def __init__(self, matrix):
+        """ Factorization of a square matrix that is reused to solve any number of right hand sides.
+
+        Symmetric positive definite matrices are factorized by Cholesky, any other matrix by LU with partial pivoting.
+
+        :param matrix: np.matrix - Any n by n sized nonsingular matrix (e.g. the Newmark effective stiffness).
+        :return: None
+        """
+        matrix = dense(matrix)
+        self.shape = matrix.shape
+        self.method = None
+
+        if np.allclose(matrix, matrix.T):
+            try:
+                self.factorization = cho_factor(matrix, check_finite=False)
+                self.method = 'Cholesky'
+            except LinAlgError:
+                pass
+
+        if self.method is None:
+            self.factorization = lu_factor(matrix, check_finite=False)
+            self.method = 'LU'
+
+    def solve(self, rhs):
+        """ Solves the factorized system by forward and back substitution only.
+
+        :param rhs: np.matrix - n sized vector or n by m sized matrix of right hand sides.
+        :return: np.ndarray - Solution with the same shape as rhs.
+        """
+        rhs = np.asarray(rhs, dtype=float)
+        if self.method == 'Cholesky':
+            return cho_solve(self.factorization, rhs, check_finite=False)
+        else:
+            return lu_solve(self.factorization, rhs, check_finite=False)
+
+
+class LowRankUpdateSolver(object):
+    def __init__(self, matrix, variableDofs, bandwidth=None):
+        """ Solver for matrices whose diagonal entries at a few DOFs change along the analysis (e.g. the nonlinear
+        TLCD damping). The base matrix is factorized once and the diagonal changes are applied as a rank-k correction
+        by the Woodbury identity, so each update only refactorizes a k by k capacitance matrix.
+
+        :param matrix: np.ndarray - Any n by n sized nonsingular base matrix (e.g. without the TLCD damping).
+        :param variableDofs: list - Indexes of the DOFs whose diagonal entries are updated.
+        :param bandwidth: tuple - Number of subdiagonals and superdiagonals. Found from the matrix if None.
+        :return: None
+        """
+        if not issparse(matrix):
+            matrix = np.asarray(matrix, dtype=float)
+        self.shape = matrix.shape
+        self.variableDofs = np.asarray(variableDofs, dtype=int)
+        self.baseDiagonal = matrix.diagonal()[self.variableDofs]
+        self.baseSolver = factorize(matrix, bandwidth)
+
+        # Columns of the base inverse at the variable DOFs: Z = A^-1 * E
+        selection = np.zeros((self.shape[0], self.variableDofs.size))
+        selection[self.variableDofs, np.arange(self.variableDofs.size)] = 1.
+        self.baseInverseColumns = self.baseSolver.solve(selection)
+        self.baseInverseBlock = self.baseInverseColumns[self.variableDofs]
+        self.update_diagonal(self.baseDiagonal)
+
+    def update_diagonal(self, values):
+        """ Replaces the diagonal entries of the variable DOFs and refactorizes the capacitance matrix.
+
+        :param values: np.ndarray - New diagonal entries, in the same order as variableDofs.
+        :return: None
+        """
+        self.diagonalChange = np.asarray(values, dtype=float) - self.baseDiagonal
+        capacitance = self.diagonalChange[:, np.newaxis] * self.baseInverseBlock
+        capacitance[np.diag_indices_from(capacitance)] += 1.
+        self.capacitanceFactorization = lu_factor(capacitance, check_finite=False)
+
+    def solve(self, rhs):
+        """ Solves the updated system with the base factorization and the rank-k correction.
+
+        :param rhs: np.ndarray - n sized vector or n by m sized matrix of right hand sides.
+        :return: np.ndarray - Solution with the same shape as rhs.
+        """
+        rhs = np.asarray(rhs, dtype=float)
+        y = self.baseSolver.solve(rhs)
+        if rhs.ndim == 1:
+            change = self.diagonalChange * y[self.variableDofs]
+        else:
+            change = self.diagonalChange[:, np.newaxis] * y[self.variableDofs]
+        y -= self.baseInverseColumns @ lu_solve(self.capacitanceFactorization, change, check_finite=False)
+        return y
+
+
+class BandedSolver(object):
+    def __init__(self, matrix, bandwidth=None):
+        """ Solver for banded matrices, factorized by the LAPACK band LU so each solve costs O(n) for a fixed bandwidth.
+        A shear building is tridiagonal and its TLCDs, numbered right after the last story and coupled only to it,
+        border that chain with an arrow of bandwidth equal to the number of TLCDs.
+
+        :param matrix: np.ndarray - Any n by n sized nonsingular banded matrix.
+        :param bandwidth: tuple - Number of subdiagonals and superdiagonals. Found from the matrix if None.
+        :return: None
+        """
+        if not issparse(matrix):
+            matrix = np.asarray(matrix, dtype=float)
+        if bandwidth is None:
+            bandwidth = find_bandwidth(matrix)
+
+        self.shape = matrix.shape
+        self.kl, self.ku = bandwidth
+
+        # LAPACK band storage with kl extra rows for the fill-in of the row interchanges
+        ab = np.zeros((2 * self.kl + self.ku + 1, self.shape[0]), order='F')
+        ab[self.kl:] = band_storage(matrix, self.kl, self.ku)
+        self.lu, self.ipiv, info = dgbtrf(ab, self.kl, self.ku, overwrite_ab=1)
+        if info > 0:
+            raise LinAlgError('Singular matrix.')
+
+    def solve(self, rhs):
+        """ Solves the factorized banded system.
+
+        :param rhs: np.ndarray - n sized vector or n by m sized matrix of right hand sides.
+        :return: np.ndarray - Solution with the same shape as rhs.
+        """
+        x, info = dgbtrs(self.lu, self.kl, self.ku, rhs, self.ipiv)
+        return x
+
+
+class SparseSolver(object):
+    def __init__(self, matrix):
+        """ Solver for sparse matrices without a narrow band, factorized by the SuperLU sparse LU.
+
+        :param matrix: scipy.sparse matrix - Any n by n sized nonsingular matrix.
+        :return: None
+        """
+        self.shape = matrix.shape
+        self.factorization = splu(csc_matrix(matrix))
+
+    def solve(self, rhs):
+        """ Solves the factorized sparse system.
+
+        :param rhs: np.ndarray - n sized vector or n by m sized matrix of right hand sides.
+        :return: np.ndarray - Solution with the same shape as rhs.
+        """
+        return self.factorization.solve(dense(rhs))
+
+
+class MatrixOperator(object):
+    def __init__(self, matrix, bandwidth=None):
+        """ Matrix used in repeated matrix-vector products along the analysis. Large banded matrices are kept in band
+        storage and multiplied by BLAS, so each product costs O(n) instead of O(n^2).
+
+        :param matrix: np.ndarray or scipy.sparse matrix - Any n by n sized matrix.
+        :param bandwidth: tuple - Number of subdiagonals and superdiagonals. Found from the matrix if None.
+        :return: None
+        """
+        self.shape = matrix.shape
+        self.banded = False
+        self.sparse = False
+
+        if self.shape[0] >= STRUCTURED_SIZE:
+            if bandwidth is None:
+                bandwidth = find_bandwidth(matrix)
+            self.kl, self.ku = bandwidth
+            self.banded = is_narrow_band(self.shape[0], self.kl, self.ku)
+
+        if self.banded:
+            self.matrix = np.asfortranarray(band_storage(matrix, self.kl, self.ku))
+        elif issparse(matrix) and self.shape[0] >= STRUCTURED_SIZE:
+            self.matrix = csr_matrix(matrix, dtype=float, copy=True)
+            self.sparse = True
+        else:
+            self.matrix = np.array(dense(matrix), dtype=float)
+
+    def dot(self, vector, out):
+        """ Matrix-vector product written into a preallocated array.
+
+        :param vector: np.ndarray - n sized vector.
+        :param out: np.ndarray - n sized array that receives the product.
+        :return: np.ndarray - out
+        """
+        if self.banded:
+            return dgbmv(self.shape[0], self.shape[1], self.kl, self.ku, 1., self.matrix, vector, y=out,
+                         overwrite_y=1)
+        elif self.sparse:
+            out[:] = self.matrix @ vector
+            return out
+        else:
+            return np.dot(self.matrix, vector, out=out)
+
+    def set_diagonal(self, dofs, values):
+        """ Replaces diagonal entries of the matrix.
+
+        :param dofs: list - Indexes of the diagonal entries.
+        :param values: np.ndarray - New diagonal entries, in the same order as dofs.
+        :return: None
+        """
+        if self.banded:
+            self.matrix[self.ku, dofs] = values
+        else:
+            self.matrix[dofs, dofs] = values
+
+
+def find_bandwidth(matrix):
+    """ Function that finds the number of nonzero subdiagonals and superdiagonals of a matrix.
+
+    :param matrix: np.ndarray or scipy.sparse matrix - Any n by n sized matrix.
+    :return: tuple - Lower and upper bandwidths.
+    """
+    if issparse(matrix):
+        matrix = matrix.tocoo()
+        nonzero = matrix.data != 0
+        rows, cols = matrix.row[nonzero], matrix.col[nonzero]
+    else:
+        rows, cols = np.nonzero(matrix)
+    if rows.size == 0:
+        return 0, 0
+    return max(int(np.max(rows - cols)), 0), max(int(np.max(cols - rows)), 0)
+
+
+def is_narrow_band(n, kl, ku):
+    """ Function that tells whether banded storage pays off for a matrix of order n and bandwidths kl and ku.
+
+    :param n: int - Order of the matrix.
+    :param kl: int - Lower bandwidth.
+    :param ku: int - Upper bandwidth.
+    :return: bool - True if the band is narrow enough.
+    """
+    return 4 * (kl + ku + 1) <= n
+
+
+def band_storage(matrix, kl, ku):
+    """ Function that converts a dense matrix to the LAPACK/BLAS band storage, where ab[ku + i - j, j] = A[i, j].
+
+    :param matrix: np.ndarray or scipy.sparse matrix - Any n by n sized matrix.
+    :param kl: int - Lower bandwidth.
+    :param ku: int - Upper bandwidth.
+    :return: np.ndarray - (kl + ku + 1) by n sized band storage.
+    """
+    n = matrix.shape[0]
+    ab = np.zeros((kl + ku + 1, n))
+    for k in range(-kl, ku + 1):
+        diagonal = matrix.diagonal(k) if issparse(matrix) else np.diagonal(matrix, k)
+        if k >= 0:
+            ab[ku - k, k:] = diagonal
+        else:
+            ab[ku - k, :n + k] = diagonal
+    return ab
+
+
+def factorize(matrix, bandwidth=None):
+    """ Function that factorizes a matrix with the cheapest solver available for its pattern: BandedSolver for large
+    banded matrices (tridiagonal shear buildings with or without TLCDs), SparseSolver for other large sparse matrices
+    and the dense LinearSolver otherwise.
+
+    :param matrix: np.ndarray or scipy.sparse matrix - Any n by n sized nonsingular matrix.
+    :param bandwidth: tuple - Number of subdiagonals and superdiagonals. Found from the matrix if None.
+    :return: object - Solver with a solve(rhs) method.
+    """
+    if not issparse(matrix):
+        matrix = np.asarray(matrix, dtype=float)
+    if matrix.shape[0] >= STRUCTURED_SIZE:
+        if bandwidth is None:
+            bandwidth = find_bandwidth(matrix)
+        kl, ku = bandwidth
+        if is_narrow_band(matrix.shape[0], kl, ku):
+            try:
+                return BandedSolver(matrix, (kl, ku))
+            except LinAlgError:
+                pass
+        if issparse(matrix):
+            return SparseSolver(matrix)
+    return LinearSolver(matrix)
+
+
+def dense(matrix):
+    """ Function that returns a sparse matrix as a dense np.ndarray, and any other matrix as a float np.ndarray.
+
+    :param matrix: np.ndarray or scipy.sparse matrix - Any matrix.
+    :return: np.ndarray - Dense matrix.
+    """
+    if issparse(matrix):
+        return matrix.toarray()
+    return np.asarray(matrix, dtype=float)
+
+
+def matrix_diagonal(matrix):
+    """ Function that returns the main diagonal of a dense or sparse matrix.
+
+    :param matrix: np.ndarray or scipy.sparse matrix - Any n by n sized matrix.
+    :return: np.ndarray - n sized diagonal.
+    """
+    if issparse(matrix):
+        return matrix.diagonal()
+    return np.diagonal(np.asarray(matrix, dtype=float))
@@ -0,0 +1,59 @@
+import numpy as np
+
+
+class LowRankForce(object):
+    def __init__(self, left, right):
+        """ Force matrix stored as the product left @ right without being materialized. For the n by t sized force
+        matrix of a ground excitation, left holds the n by r sized influence vectors (the story masses, the TLCD masses)
+        and right the r by t sized time histories, so it takes (n + t) * r instead of n * t entries.
+
+        The transpose is also a LowRankForce, so the time stepping methods use it as a time-major force history: the
+        force at the time step i is computed on demand by indexing it.
+
+        :param left: np.ndarray - n by r sized matrix (e.g. the influence vectors of each time history).
+        :param right: np.ndarray - r by t sized matrix (e.g. the time histories).
+        :return: None
+        """
+        self.left = np.ascontiguousarray(left, dtype=float)
+        self.right = np.ascontiguousarray(right, dtype=float)
+        self.shape = (self.left.shape[0], self.right.shape[1])
+        self.ndim = 2
+        self.dtype = np.dtype(float)
+
+    @property
+    def T(self):
+        return LowRankForce(self.right.T, self.left.T)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, index):
+        """ Rows of the matrix. A slice of rows is returned as a LowRankForce, anything else as an np.ndarray.
+
+        :param index: int - Index of the row (e.g. the time step of a time-major force history), or slice.
+        :return: np.ndarray - Row of the matrix.
+        """
+        if isinstance(index, slice):
+            return LowRankForce(self.left[index], self.right)
+        return self.left[index] @ self.right
+
+    def __array__(self, dtype=None, copy=None):
+        matrix = self.left @ self.right
+        if dtype is not None:
+            return matrix.astype(dtype, copy=False)
+        return matrix
+
+    def __str__(self):
+        return str(np.asarray(self))
+
+    def absolute_max(self, chunkSize=2 ** 20):
+        """ Maximum absolute value of each row, computed over chunks of columns so the matrix is never materialized.
+
+        :param chunkSize: int - Maximum number of matrix entries of each chunk.
+        :return: np.ndarray - n sized maximum of each row.
+        """
+        peak = np.zeros(self.shape[0])
+        step = max(chunkSize // max(self.shape[0], 1), 1)
+        for start in range(0, self.shape[1], step):
+            np.maximum(peak, np.max(np.absolute(self.left @ self.right[:, start:start + step]), axis=1), out=peak)
+        return peak
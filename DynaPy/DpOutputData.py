@@ -1,15 +1,24 @@
 import numpy as np
+from .DpLinearSolver import matrix_diagonal
+from .DpLowRankForce import LowRankForce
 from .DynaSolver import ODESolver
 
 
 class OutputData(object):
-    def __init__(self, massMatrix, dampingMatrix, stiffnessMatrix, forceMatrix, configurations, tlcd):
+    def __init__(self, massMatrix, dampingMatrix, stiffnessMatrix, forceMatrix, configurations, tlcd,
+                 steadyStatePeriod=None, initialPeak=None):
         """
-        :param massMatrix: np.matrix - Any n by n sized mass matrix
-        :param dampingMatrix: np.matrix - Any n by n sized damping matrix
-        :param stiffnessMatrix: np.matrix - Any n by n sized stiffness matrix
-        :param forceMatrix: np.matrix - Any n by t sized matrix composed of n by 1 sized force vectors (force over time)
+        :param massMatrix: np.ndarray - Any n by n sized mass matrix
+        :param dampingMatrix: np.ndarray - Any n by n sized damping matrix
+        :param stiffnessMatrix: np.ndarray - Any n by n sized stiffness matrix
+        :param forceMatrix: np.ndarray - Any n by t sized matrix composed of n by 1 sized force vectors (force over
+        time), or a LowRankForce
         :param configurations: object - Configurations object containing informations like time step.
+        :param tlcd: object - Data of the building tlcd.
+        :param steadyStatePeriod: float - Period of a harmonic excitation, to stop the analysis at the steady state
+        and use its peak displacement in the DMF.
+        :param initialPeak: np.ndarray - Steady-state peak displacement of each DOF of the initial state (see
+        ODESolver).
         :return: None
         """
         self.massMatrix = massMatrix
@@ -18,17 +27,23 @@ class OutputData(object):
         self.forceMatrix = forceMatrix
 
         self.dynamicResponse = ODESolver(self.massMatrix, self.dampingMatrix, self.stiffnessMatrix, self.forceMatrix,
-                                         configurations, tlcd)
+                                         configurations, tlcd, steadyStatePeriod, initialPeak)
         self.calc_dmf()
 
     def calc_dmf(self):
         self.maxDisplacement = []
         self.DMF = []
+        if self.dynamicResponse.steadyStatePeak is not None:
+            x_dyn = self.dynamicResponse.steadyStatePeak
+        else:
+            x_dyn = np.max(np.absolute(self.dynamicResponse.displacement), axis=0)
+        if isinstance(self.forceMatrix, LowRankForce):
+            F = self.forceMatrix.absolute_max()
+        else:
+            F = np.max(np.absolute(np.asarray(self.forceMatrix)), axis=1)
+        K = matrix_diagonal(self.stiffnessMatrix)
         for i in range(self.massMatrix.shape[0]):
-            x_dyn = max(np.absolute(self.dynamicResponse.x[i, :].A1))
-            F = max(np.absolute(self.forceMatrix[i, :].A1))
-            K = self.stiffnessMatrix[i, i]
-            x_stat = F/K
-            if F != 0:
-                self.maxDisplacement.append(x_dyn)
-                self.DMF.append(x_dyn/x_stat)
+            x_stat = F[i]/K[i]
+            if F[i] != 0:
+                self.maxDisplacement.append(x_dyn[i])
+                self.DMF.append(x_dyn[i]/x_stat)
@@ -0,0 +1,99 @@
+from collections import OrderedDict
+from hashlib import blake2b
+from threading import Lock
+
+import numpy as np
+
+
+class RecordCache(object):
+    def __init__(self, maxBytes=64e6):
+        """ Least recently used cache of arrays (e.g. excitation records resampled onto the time steps of an analysis),
+        limited by the memory they take. The cached arrays are shared, so they are made read-only.
+
+        :param maxBytes: float - Memory cap of the cached arrays (bytes). The least recently used arrays are evicted
+        above it.
+        :return: None
+        """
+        self.maxBytes = maxBytes
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """ Returns the array stored under a key and marks it as the most recently used.
+
+        :param key: tuple - Hashable key.
+        :return: np.ndarray - Cached array, or None if the key is not cached.
+        """
+        with self.lock:
+            array = self.entries.get(key)
+            if array is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return array
+
+    def put(self, key, array):
+        """ Stores an array under a key and evicts the least recently used arrays above the memory cap. Arrays larger
+        than the cap are not stored.
+
+        :param key: tuple - Hashable key.
+        :param array: np.ndarray - Array to cache.
+        :return: np.ndarray - The array, now read-only.
+        """
+        array.flags.writeable = False
+        with self.lock:
+            if key in self.entries:
+                self.nbytes -= self.entries.pop(key).nbytes
+            if array.nbytes <= self.maxBytes:
+                self.entries[key] = array
+                self.nbytes += array.nbytes
+            self.evict()
+        return array
+
+    def resize(self, maxBytes):
+        """ Changes the memory cap, evicting the least recently used arrays above it.
+
+        :param maxBytes: float - Memory cap of the cached arrays (bytes).
+        :return: None
+        """
+        with self.lock:
+            self.maxBytes = maxBytes
+            self.evict()
+
+    def evict(self):
+        """ Drops the least recently used arrays until the cached ones fit the memory cap.
+
+        :return: None
+        """
+        while self.nbytes > self.maxBytes and self.entries:
+            self.nbytes -= self.entries.popitem(last=False)[1].nbytes
+
+    def clear(self):
+        """ Drops every cached array.
+
+        :return: None
+        """
+        with self.lock:
+            self.entries.clear()
+            self.nbytes = 0
+
+
+def content_hash(*arrays):
+    """ Function that returns a digest of the shapes and contents of float arrays, to key caches by content.
+
+    :param arrays: np.ndarray - Any arrays.
+    :return: str - Hexadecimal digest.
+    """
+    digest = blake2b(digest_size=16)
+    for array in arrays:
+        array = np.ascontiguousarray(array, dtype=float)
+        digest.update(repr(array.shape).encode())
+        digest.update(array.tobytes())
+    return digest.hexdigest()
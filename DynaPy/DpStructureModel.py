@@ -0,0 +1,107 @@
+import numpy as np
+from .DpStory import Story
+
+# Stiffness of a column for each type of support, in units of E * I / h^3
+SUPPORT_STIFFNESS = {'Fix-Fix': 24., 'Fix-Pin': 15., 'Pin-Fix': 15., 'Pin-Pin': 6.}
+
+
+class StructureModel(object):
+    def __init__(self, mass=10.e3, height=3., width=.35, depth=.35, E=25.e9, support='Fix-Fix', tlcd=None,
+                 numberOfStories=None, dampingCoefficient=None):
+        """ Columnar model of a shear building. Each story property is an np.ndarray ordered from the first story up,
+        so the derived properties and the matrix assembly are vectorized over the stories.
+
+        :param mass: float - mass of the stories (kg), or np.ndarray with the mass of each story
+        :param height: float - height of the stories (m), or np.ndarray with the height of each story
+        :param width: float - width of the columns (m), or np.ndarray with the width of each story
+        :param depth: float - depth of the columns (m), or np.ndarray with the depth of each story
+        :param E: float - Elasticity module of the columns (Pa), or np.ndarray with the one of each story
+        :param support: str - Type of support of the column bases, or list with the one of each story
+        :param tlcd: object - Data of the building tlcd, placed on the last story
+        :param numberOfStories: int - Number of stories. Found from the sizes of the arrays if None.
+        :param dampingCoefficient: np.ndarray - Damping coefficient of each story. See calc_damping_coefficient.
+        :return: None
+        """
+        properties = [np.atleast_1d(np.asarray(i, dtype=float)) for i in (mass, height, width, depth, E)]
+        supports = np.atleast_1d(np.asarray(support, dtype=object))
+        if numberOfStories is not None:
+            properties.append(np.zeros(numberOfStories))
+        shape = np.broadcast_shapes(supports.shape, *(i.shape for i in properties))
+        self.mass, self.height, self.width, self.depth, self.E = \
+            (np.array(np.broadcast_to(i, shape)) for i in properties[:5])
+        self.support = np.array(np.broadcast_to(supports, shape))
+        self.tlcd = tlcd
+
+        self.I = (self.width*self.depth**3)/12
+        supportStiffness = np.array([SUPPORT_STIFFNESS[i] for i in self.support])
+        self.stiffness = supportStiffness*self.E*self.I/(self.height**3)
+
+        # The tlcd moves with the last story, so its mass counts in the frequency of that story
+        totalMass = self.mass.copy()
+        if self.tlcd is not None:
+            totalMass[-1] += self.tlcd.mass
+        self.naturalFrequency = np.sqrt(self.stiffness/totalMass)
+        self.criticalDamping = 2*totalMass*self.naturalFrequency
+
+        self.dampingCoefficient = None
+        if dampingCoefficient is not None:
+            self.dampingCoefficient = np.array(np.broadcast_to(np.asarray(dampingCoefficient, dtype=float), shape))
+
+    def __len__(self):
+        return self.mass.shape[0]
+
+    def __getitem__(self, story):
+        """ Story object of a story, numbered from 1 like the keys of the stories dict used by the GUI.
+
+        :param story: int - Number of the story.
+        :return: object - Story object.
+        """
+        if not 1 <= story <= len(self):
+            raise KeyError(story)
+        i = story - 1
+        tlcd = self.tlcd if story == len(self) else None
+        storyObject = Story(float(self.mass[i]), float(self.height[i]), float(self.width[i]), float(self.depth[i]),
+                            float(self.E[i]), str(self.support[i]), tlcd)
+        if self.dampingCoefficient is not None:
+            storyObject.dampingCoefficient = float(self.dampingCoefficient[i])
+        return storyObject
+
+    def calc_damping_coefficient(self, dampingRatio):
+        """ Sets the damping coefficient of each story from its critical damping.
+
+        :param dampingRatio: float - Damping ratio of the stories, or np.ndarray with the one of each story.
+        :return: None
+        """
+        self.dampingCoefficient = self.criticalDamping * dampingRatio
+
+    def to_stories(self):
+        """ Converts the model to the stories dict used by the GUI.
+
+        :return: dict - Dictionary of Story objects keyed by the story number.
+        """
+        return {i: self[i] for i in range(1, len(self) + 1)}
+
+
+def as_structure_model(stories):
+    """ Function that converts the stories dict used by the GUI to a StructureModel. Models are returned as they are.
+
+    :param stories: dict - Dictionary of objects containing data of each story of the building, or a StructureModel.
+    :return: object - StructureModel.
+    """
+    if isinstance(stories, StructureModel):
+        return stories
+
+    storyObjects = [stories[i + 1] for i in range(len(stories))]
+    dampingCoefficient = None
+    if all(hasattr(i, 'dampingCoefficient') for i in storyObjects):
+        dampingCoefficient = [i.dampingCoefficient for i in storyObjects]
+    structure = StructureModel([i.mass for i in storyObjects], [i.height for i in storyObjects],
+                               [i.width for i in storyObjects], [i.depth for i in storyObjects],
+                               [i.E for i in storyObjects], [i.support for i in storyObjects],
+                               storyObjects[-1].tlcd if storyObjects else None, len(storyObjects), dampingCoefficient)
+
+    # The properties already derived by each story are kept, since np.power and the C pow of the Story objects may
+    # differ in the last bit
+    for name in ('I', 'stiffness', 'naturalFrequency', 'criticalDamping'):
+        setattr(structure, name, np.array([getattr(i, name) for i in storyObjects], dtype=float))
+    return structure
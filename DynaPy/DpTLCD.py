@@ -1,4 +1,4 @@
-from math import pi
+from math import log10, pi
 
 import numpy as np
 from .DpConfigurations import Configurations
@@ -66,6 +66,17 @@ class TLCD(object):
         return velocity * self.diameter / self.kineticViscosity
 
     def calculate_friction_factor(self, velocity):
+        """ Friction factor of the liquid flow. Scalars take a plain Python path, since the time stepping methods call
+        it once per step, and arrays are evaluated at once.
+
+        :param velocity: float or np.ndarray - Absolute liquid velocity (m/s).
+        :return: float or np.ndarray - Friction factor.
+        """
+        if isinstance(velocity, (int, float)):
+            return self.scalar_friction_factor(float(velocity))
+        return self.array_friction_factor(velocity)
+
+    def scalar_friction_factor(self, velocity):
         if velocity == 0.:
             return 0
 
@@ -73,15 +84,33 @@ class TLCD(object):
         k = self.pipeRoughness
         D = self.diameter
 
-        b = (k / (3.7 * D) - (5.16 / Re) * np.log10((k / 3.7 * D) + (5.09 / (Re ** 0.87))))
+        b = (k / (3.7 * D) - (5.16 / Re) * log10((k / 3.7 * D) + (5.09 / (Re ** 0.87))))
 
-        if b < 0:
+        if b <= 0:
             return 0
 
-        a = -2 * np.log10(b)
+        a = -2 * log10(b)
         f = (1 / a) ** 2
         return f
 
+    def array_friction_factor(self, velocity):
+        velocity = np.asarray(velocity, dtype=float)
+        f = np.zeros(velocity.shape)
+        moving = velocity != 0.
+
+        Re = self.calculate_reynolds(velocity[moving])
+        k = self.pipeRoughness
+        D = self.diameter
+
+        b = (k / (3.7 * D) - (5.16 / Re) * np.log10((k / 3.7 * D) + (5.09 / (Re ** 0.87))))
+
+        turbulent = b > 0
+        a = -2 * np.log10(b[turbulent])
+        fMoving = np.zeros(b.shape)
+        fMoving[turbulent] = (1 / a) ** 2
+        f[moving] = fMoving
+        return f
+
     def calculate_damping_correction_factor(self, velocity):
         f = self.calculate_friction_factor(velocity)
         return f * velocity
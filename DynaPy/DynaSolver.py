@@ -1,27 +1,56 @@
-from copy import copy
-
 from .DpConfigurations import Configurations
+from .DpLowRankForce import LowRankForce
+from .DpRecordCache import RecordCache, content_hash
+from .DpStructureModel import as_structure_model
+from .DpLinearSolver import STRUCTURED_SIZE, LowRankUpdateSolver, MatrixOperator, dense, factorize, find_bandwidth, \
+    matrix_diagonal
 import numpy as np
-from scipy.linalg import eig, eigvals
+from scipy.fft import irfft, next_fast_len, rfft, rfftfreq
+from scipy.linalg import eig, eigh, eigvals, eigvalsh, expm
+from scipy.sparse import coo_matrix, csc_matrix, diags, issparse
+from scipy.sparse.linalg import eigsh, splu
+
+# General Excitation records resampled onto the time steps of previous analyses, shared by every run of the process
+resampledRecordCache = RecordCache()
 
 
 class ODESolver(object):
-    def __init__(self, mass, damping, stiffness, force, configurations=Configurations(), tlcd=None):
+    def __init__(self, mass, damping, stiffness, force, configurations=Configurations(), tlcd=None,
+                 steadyStatePeriod=None, initialPeak=None):
         """ ODE solver for dynamics problems.
 
-        :param mass: np.matrix - Mass matrix including structure and damper masses.
-        :param damping: np.matrix - Damping matrix including structure and damper damping coefficients.
-        :param stiffness: np.matrix - Stiffness matrix including structure and damper stiffness coefficients.
-        :param force: np.matrix - Force vector representing force over time in each DOF.
+        The response is stored in time-major np.ndarrays (displacement, velocity and acceleration), one C-contiguous
+        row per time step. The x, v, a and F attributes are kept as n by t sized np.matrix views of those arrays.
+
+        The matrices may be scipy.sparse matrices (e.g. from the assembly functions with sparse=True). The finite
+        differences and Newmark methods keep them sparse, the other methods work on their dense copies.
+
+        :param mass: np.ndarray - Mass matrix including structure and damper masses.
+        :param damping: np.ndarray - Damping matrix including structure and damper damping coefficients.
+        :param stiffness: np.ndarray - Stiffness matrix including structure and damper stiffness coefficients.
+        :param force: np.ndarray - Force vector representing force over time in each DOF, or a LowRankForce (e.g. from
+        assemble_force_matrix with lazy=True).
         :param configurations: object - Object containing boundary conditions and other configurations.
 
                 configurations.method: str - Name of the method to be used in the solver. Possible names:
-                    'Finite Differences', 'Average Acceleration', 'Linear Acceleration', 'RK4'
+                    'Finite Differences', 'Average Acceleration', 'Linear Acceleration', 'RK4', 'Matrix Exponential',
+                    'Modal Superposition', 'Frequency Domain'
 
                 configurations.timeStep: float - Time step between iterations.
-                configurations.initialDisplacement: float - Initial displacement of the base.
-                configurations.initialVelocity: float - Initial velocity of the base
-
+                configurations.initialDisplacement: float - Initial displacement of all DOFs, or np.ndarray with the
+                    initial displacement of each DOF.
+                configurations.initialVelocity: float - Initial velocity of all DOFs, or np.ndarray with the initial
+                    velocity of each DOF.
+                configurations.dmfSteadyStateTolerance: float - Convergence tolerance of the steady-state peak
+                configurations.nonLinearMethod: str - 'Time Stepping' or 'Equivalent Linearization' of the nonlinear
+                    TLCD damping
+
+        :param tlcd: object - Data of the building tlcd.
+        :param steadyStatePeriod: float - Period of a harmonic excitation. If given, the time stepping methods stop
+        once the peak displacement of each cycle converges, store it as steadyStatePeak and truncate the response.
+        :param initialPeak: np.ndarray - Steady-state peak displacement of each DOF of the state the analysis starts
+        from (e.g. the previous frequency of a warm-started DMF sweep). The first window of excitation cycles is then
+        compared with it instead of being discarded as the transient from rest.
         :return: None
         """
         self.mass = mass
@@ -30,182 +59,654 @@ class ODESolver(object):
         self.force = force
         self.configurations = configurations
         self.tlcd = tlcd
+        self.steadyStatePeriod = steadyStatePeriod
+        self.steadyStatePeak = None
+        self.initialPeak = initialPeak
 
-        if configurations.method == 'Finite Differences Method':
-            if configurations.nonLinearAnalysis and (self.tlcd is not None):
-                self.fdm_solver(nonlinear=True)
-            else:
-                self.fdm_solver(nonlinear=False)
-        elif configurations.method == 'Average Acceleration Method':
-            if configurations.nonLinearAnalysis and (self.tlcd is not None):
+        nonlinear = configurations.nonLinearAnalysis and (self.tlcd is not None)
+        if nonlinear and configurations.nonLinearMethod == 'Equivalent Linearization':
+            self.equivalent_linearization_solver()
+        else:
+            self.solve(nonlinear)
+
+    def solve(self, nonlinear):
+        """ Runs the solution method set in the configurations.
+
+        :param nonlinear: bool - Whether the TLCD damping is updated along the analysis.
+        :return: None
+        """
+        if self.configurations.method == 'Finite Differences Method':
+            self.fdm_solver(nonlinear=nonlinear)
+        elif self.configurations.method == 'Average Acceleration Method':
+            self.newmark_solver(gamma=1/2, beta=1/4, nonlinear=nonlinear)
+        elif self.configurations.method == 'Linear Acceleration Method':
+            self.newmark_solver(gamma=1/2, beta=1/6, nonlinear=nonlinear)
+        elif self.configurations.method == 'Runge-Kutta Method':
+            self.rk4_solver(nonlinear=nonlinear)
+        elif self.configurations.method == 'Matrix Exponential Method':
+            if nonlinear:
+                # The propagator is only exact for constant damping, so nonlinear runs use the unconditionally
+                # stable average acceleration method instead
                 self.newmark_solver(gamma=1/2, beta=1/4, nonlinear=True)
             else:
-                self.newmark_solver(gamma=1/2, beta=1/4, nonlinear=False)
-        elif configurations.method == 'Linear Acceleration Method':
-            if configurations.nonLinearAnalysis and (self.tlcd is not None):
-                self.newmark_solver(gamma=1/2, beta=1/6, nonlinear=True)
+                self.expm_solver(holdOrder=self.configurations.holdOrder)
+        elif self.configurations.method == 'Modal Superposition Method':
+            if nonlinear:
+                # Modes only decouple a linear system, so nonlinear runs use the average acceleration method instead
+                self.newmark_solver(gamma=1/2, beta=1/4, nonlinear=True)
             else:
-                self.newmark_solver(gamma=1/2, beta=1/6, nonlinear=False)
-        elif configurations.method == 'Runge-Kutta Method':
-            if configurations.nonLinearAnalysis and (self.tlcd is not None):
-                self.rk4_solver(nonlinear=True)
+                self.modal_superposition_solver(massParticipation=self.configurations.modalMassParticipation,
+                                                holdOrder=self.configurations.holdOrder)
+        elif self.configurations.method == 'Frequency Domain Method':
+            if nonlinear:
+                # The transfer matrix only exists for linear systems, so nonlinear runs use the average acceleration
+                # method instead
+                self.newmark_solver(gamma=1/2, beta=1/4, nonlinear=True)
             else:
-                self.rk4_solver(nonlinear=False)
-
-    def unpack(self):
-        self.M = self.mass
-        self.C = self.damping
-        self.K = self.stiffness
-        self.F = self.force
+                self.frequency_domain_solver()
+
+    def equivalent_linearization_solver(self, maxIterations=50):
+        """ Solver that replaces the nonlinear TLCD damping by the energy-equivalent linear damping coefficient, the one
+        that dissipates the same energy as the nonlinear damping over the velocity history of the last TLCD. Each
+        iteration runs the linear solution method set in the configurations, so every linear solver serves nonlinear
+        models too. The iterations stop when the coefficient changes less than
+        configurations.equivalentDampingTolerance. The coefficient of each iteration is kept in
+        equivalentDampingHistory, the final one in equivalentDamping and the convergence in
+        equivalentDampingConverged.
+
+        :param maxIterations: int - Maximum number of linear solutions.
+        :return: None
+        """
+        baseDamping = self.damping if issparse(self.damping) else np.array(self.damping, dtype=float)
+        n = baseDamping.shape[0]
+        tlcdDofs = np.arange(n - self.tlcd.amount, n)
+        tolerance = self.configurations.equivalentDampingTolerance
+
+        damping = initial_equivalent_damping(self.tlcd)
+        previous = None
+        self.equivalentDampingHistory = []
+        self.equivalentDampingConverged = False
+        for iteration in range(maxIterations):
+            self.damping = replace_diagonal(baseDamping, tlcdDofs, damping)
+            self.solve(nonlinear=False)
+            self.equivalentDampingHistory.append(damping)
+
+            equivalentDamping = equivalent_damping_coefficient(self.tlcd, self.velocity[:, -1])
+            if abs(equivalentDamping - damping) <= tolerance * max(equivalentDamping, damping):
+                self.equivalentDampingConverged = True
+                break
+            update = update_equivalent_damping(damping, equivalentDamping, previous)
+            previous = (damping, equivalentDamping)
+            damping = float(update)
+
+        self.damping = baseDamping
+        self.equivalentDamping = damping
+
+    @property
+    def x(self):
+        return np.asmatrix(self.displacement.T)
+
+    @property
+    def v(self):
+        return np.asmatrix(self.velocity.T)
+
+    @property
+    def a(self):
+        return np.asmatrix(self.acceleration.T)
+
+    @property
+    def F(self):
+        return np.asmatrix(np.asarray(self.forceHistory).T)
+
+    def unpack(self, sparse=False, lazyForce=False):
+        """ Sets up the matrices, the force history and the initial conditions of the analysis.
+
+        :param sparse: bool - Whether sparse input matrices are kept sparse. Dense copies are used otherwise.
+        :param lazyForce: bool - Whether a LowRankForce input is kept as a time-major LowRankForce, computing the force
+        of each time step on demand. It is materialized otherwise.
+        :return: None
+        """
+        # The damping matrix is copied since the nonlinear solvers update its TLCD entries
+        if sparse and any(issparse(matrix) for matrix in (self.mass, self.damping, self.stiffness)):
+            self.M = csc_matrix(self.mass, dtype=float)
+            self.C = csc_matrix(self.damping, dtype=float, copy=True)
+            self.K = csc_matrix(self.stiffness, dtype=float)
+        else:
+            self.M = np.array(dense(self.mass))
+            self.C = np.array(dense(self.damping))
+            self.K = np.array(dense(self.stiffness))
+        if isinstance(self.force, LowRankForce):
+            self.forceHistory = self.force.T if lazyForce else np.asarray(self.force.T)
+        else:
+            self.forceHistory = np.ascontiguousarray(np.asarray(self.force, dtype=float).T)
         self.dt = self.configurations.timeStep
         self.x0 = self.configurations.initialDisplacement
         self.v0 = self.configurations.initialVelocity
 
-        self.x = 0. * self.F
-        self.v = 0. * self.F
-        self.a = 0. * self.F
-        self.t = [i * self.dt for i in range(self.F.shape[1])]
+        self.displacement = np.zeros(self.forceHistory.shape)
+        self.velocity = np.zeros(self.forceHistory.shape)
+        self.acceleration = np.zeros(self.forceHistory.shape)
+        self.t = (self.dt * np.arange(self.forceHistory.shape[0])).tolist()
+
+        self.displacement[0] = self.x0
+        self.velocity[0] = self.v0
 
-        # TODO make initialDisplacement and initialVelocity vectors that represent both parameters at each DOF
-        self.x[:, 0] = self.x0
-        self.v[:, 0] = self.v0
+        self.a0 = factorize(self.M).solve(self.forceHistory[0] - self.C @ self.velocity[0] -
+                                          self.K @ self.displacement[0])
+        self.acceleration[0] = self.a0
+
+        # The peaks are compared over windows of whole excitation cycles that last at least the longest natural
+        # period, so that each window follows the decay of every free vibration mode
+        self.cyclePeak = self.initialPeak
+        if self.steadyStatePeriod is None or self.configurations.dmfSteadyStateTolerance is None:
+            self.cycleSteps = None
+        else:
+            naturalPeriod = 2 * np.pi / np.sqrt(np.max((lowest_eigenvalue(self.K, self.M), 1e-300)))
+            cycles = max(np.ceil(naturalPeriod / self.steadyStatePeriod), 1)
+            self.cycleSteps = max(int(np.ceil(cycles * self.steadyStatePeriod / self.dt)), 1)
 
-        self.a0 = self.M.I * (self.F[:, 0] - self.C * self.v[:, 0] - self.K * self.x[:, 0])
-        self.a[:, 0] = self.a0
+    def steady_state_reached(self, i):
+        """ Checks, at the end of each window of excitation cycles, whether the peak displacement of every DOF in the
+        last window converged to the one of the previous window. If so, it is stored as steadyStatePeak. Runs from rest
+        skip the first window, which holds the transient; runs given an initialPeak compare the first window with it.
+
+        :param i: int - Index of the last time step computed.
+        :return: bool - True if the steady state was reached.
+        """
+        if self.cycleSteps is None or i % self.cycleSteps != 0:
+            return False
+        firstWindow = self.cycleSteps if self.initialPeak is not None else 2 * self.cycleSteps
+        if i < firstWindow:
+            return False
+
+        # The peak of a sampled cycle varies up to (pi * dt / period)^2 / 2 even at steady state
+        peak = np.max(np.absolute(self.displacement[i - self.cycleSteps + 1:i + 1]), axis=0)
+        tolerance = max(self.configurations.dmfSteadyStateTolerance,
+                        (np.pi * self.dt / self.steadyStatePeriod) ** 2 / 2)
+        converged = self.cyclePeak is not None and np.all(np.absolute(peak - self.cyclePeak) <= tolerance * peak)
+        self.cyclePeak = peak
+        if converged:
+            self.steadyStatePeak = peak
+        return converged
+
+    def truncate(self, numberOfSteps):
+        """ Drops the time steps after the given number of steps, after the steady state is reached.
+
+        :param numberOfSteps: int - Number of time steps kept.
+        :return: None
+        """
+        self.displacement = self.displacement[:numberOfSteps]
+        self.velocity = self.velocity[:numberOfSteps]
+        self.acceleration = self.acceleration[:numberOfSteps]
+        self.forceHistory = self.forceHistory[:numberOfSteps]
+        self.t = self.t[:numberOfSteps]
 
     def fdm_solver(self, nonlinear=False):
-        self.unpack()
+        self.unpack(sparse=True, lazyForce=True)
+
+        x = self.displacement
+        f = self.forceHistory
+        rhs = np.empty(x.shape[1])
+        aux = np.empty(x.shape[1])
 
         if nonlinear:
+            tlcdDofs = self.tlcd_dofs()
+            m = matrix_diagonal(self.M)[tlcdDofs]
             self.damping_update_fdm(0)
+            self.store_tlcd_damping()
 
         self.alpha = (self.M / (self.dt ** 2) - self.C / (2 * self.dt))
         self.beta = (self.K - 2 * self.M / (self.dt ** 2))
         self.gamma = (self.M / (self.dt ** 2) + self.C / (2 * self.dt))
 
-        self.xm1 = self.x[:, 0] - self.v[:, 0] * self.dt + (self.a[:, 0] * self.dt ** 2) / 2
-        self.x[:, 1] = self.gamma.I * (self.F[:, 0] - self.beta * self.x[:, 0] - self.alpha * self.xm1)
+        if nonlinear:
+            # Only the TLCD diagonal entries of gamma change, so the structure-only gamma is factorized once and the
+            # TLCD damping enters as a rank-k correction
+            gammaStructure = self.M / (self.dt ** 2) + replace_diagonal(self.C, tlcdDofs, 0.) / (2 * self.dt)
+            gammaSolver = LowRankUpdateSolver(gammaStructure, tlcdDofs)
+            gammaSolver.update_diagonal(matrix_diagonal(self.gamma)[tlcdDofs])
+        else:
+            gammaSolver = factorize(self.gamma)
+        alphaOperator = MatrixOperator(self.alpha)
+        betaOperator = MatrixOperator(self.beta)
+
+        self.xm1 = x[0] - self.velocity[0] * self.dt + (self.acceleration[0] * self.dt ** 2) / 2
+        x[1] = gammaSolver.solve(f[0] - self.beta @ x[0] - self.alpha @ self.xm1)
 
-        for i in list(range(1, len(self.t[1:]))):
+        for i in range(1, len(self.t) - 1):
             if nonlinear:
                 if i >= 2:
                     self.damping_update_fdm(i)
+                    c = self.tlcdDamping
+                    alphaOperator.set_diagonal(tlcdDofs, m / (self.dt ** 2) - c / (2 * self.dt))
+                    gammaSolver.update_diagonal(m / (self.dt ** 2) + c / (2 * self.dt))
 
-                    self.alpha = (self.M / (self.dt ** 2) - self.C / (2 * self.dt))
-                    self.beta = (self.K - 2 * self.M / (self.dt ** 2))
-                    self.gamma = (self.M / (self.dt ** 2) + self.C / (2 * self.dt))
+            betaOperator.dot(x[i], rhs)
+            np.subtract(f[i], rhs, out=rhs)
+            alphaOperator.dot(x[i - 1], aux)
+            rhs -= aux
+            x[i + 1] = gammaSolver.solve(rhs)
 
-            self.x[:, i + 1] = self.gamma.I * (self.F[:, i] - self.beta * self.x[:, i] - self.alpha * self.x[:, i - 1])
+            if self.steady_state_reached(i + 1):
+                self.truncate(i + 2)
+                x = self.displacement
+                f = self.forceHistory
+                break
 
-        i = len(self.t[1:])
-        self.xM1 = self.gamma.I * (self.F[:, i] - self.beta * self.x[:, i] - self.alpha * self.x[:, i - 1])
-        self.xMais1 = np.concatenate((self.x[:, 1:], self.xM1), axis=1)
-        self.xMenos1 = np.concatenate((self.xm1, self.x[:, 0:-1]), axis=1)
+        i = len(self.t) - 1
+        self.xM1 = gammaSolver.solve(f[i] - self.beta @ x[i] - alphaOperator.dot(x[i - 1], aux))
 
-        self.v = (self.xMais1 - self.xMenos1) / (2 * self.dt)
-        self.a = (self.xMais1 - 2 * self.x + self.xMenos1) / (self.dt ** 2)
+        if nonlinear:
+            # The matrices keep the TLCD damping of the last time step
+            self.store_tlcd_damping()
+            self.alpha = (self.M / (self.dt ** 2) - self.C / (2 * self.dt))
+            self.gamma = (self.M / (self.dt ** 2) + self.C / (2 * self.dt))
+
+        # Central differences over the whole history, using the fictitious steps before the first and after the last
+        xPlus1 = np.empty_like(x)
+        xPlus1[:-1] = x[1:]
+        xPlus1[-1] = self.xM1
+        xMinus1 = np.empty_like(x)
+        xMinus1[1:] = x[:-1]
+        xMinus1[0] = self.xm1
+
+        self.velocity = (xPlus1 - xMinus1) / (2 * self.dt)
+        self.acceleration = (xPlus1 - 2 * x + xMinus1) / (self.dt ** 2)
 
     def damping_update_fdm(self, i):
-        correctionStart = self.C.shape[1] - 1
-        correctionStop = correctionStart - self.tlcd.amount
+        """ Updates tlcdDamping, the nonlinear damping coefficient of the TLCDs, from the central difference velocity
+        of the last DOF.
 
+        :param i: int - Index of the time step.
+        :return: None
+        """
         if i >= 1:
-            self.dampingVelocityArray[0, i + 1] = (self.x[-1, i-2] - self.x[-1, i]) / (2 * self.dt)
-            velocity = abs(self.dampingVelocityArray[0, i + 1])
+            self.dampingVelocityArray[i + 1] = (self.displacement[i - 2, -1] - self.displacement[i, -1]) / (2 * self.dt)
+            velocity = abs(self.dampingVelocityArray[i + 1])
         else:
-            self.dampingVelocityArray = copy(self.v[-1, :])
-            velocity = self.dampingVelocityArray[0, 0]
+            self.dampingVelocityArray = np.array(self.velocity[:, -1])
+            velocity = abs(self.dampingVelocityArray[0])
 
         correctionFactor = self.tlcd.calculate_damping_correction_factor(velocity)
         contractionDampingCoefficient = self.tlcd.calculate_contraction_damping(velocity)
+        self.tlcdDamping = self.tlcd.dampingCoefficientConstant * correctionFactor + contractionDampingCoefficient
 
-        for j in range(correctionStart, correctionStop, -1):
-            self.C[j, j] = self.tlcd.dampingCoefficientConstant * correctionFactor
-            self.C[j, j] += contractionDampingCoefficient
-
-    
     def newmark_solver(self, gamma=1/2, beta=1/4, nonlinear=False):
-        self.unpack()
-        
-        for i in list(range(0, len(self.t[1:]) - 1)):
+        self.unpack(sparse=True, lazyForce=True)
+
+        x = self.displacement
+        v = self.velocity
+        a = self.acceleration
+        f = self.forceHistory
+        dp_eff = np.empty(x.shape[1])
+        aux = np.empty(x.shape[1])
+        bandwidth = find_bandwidth(abs(self.M) + abs(self.C) + abs(self.K))
+
+        # Linear systems keep the same effective stiffness over the whole analysis, so it is factorized once. In
+        # nonlinear systems the structure-only effective stiffness is factorized once and the TLCD damping enters as
+        # a rank-k correction
+        k_eff, a_eff, b_eff = self.newmark_matrices(gamma, beta)
+        a_eff = MatrixOperator(a_eff, bandwidth)
+        b_eff = MatrixOperator(b_eff, bandwidth)
+        if nonlinear:
+            tlcdDofs = self.tlcd_dofs()
+            m = matrix_diagonal(self.M)[tlcdDofs]
+            k = matrix_diagonal(self.K)[tlcdDofs]
+            k_eff = replace_diagonal(k_eff, tlcdDofs, k + 1/(beta*self.dt**2) * m)
+            k_eff_solver = LowRankUpdateSolver(k_eff, tlcdDofs, bandwidth)
+        else:
+            k_eff_solver = factorize(k_eff, bandwidth)
+
+        for i in range(0, len(self.t) - 2):
             if nonlinear:
                 self.damping_update_nm(i)
+                c = self.tlcdDamping
+                k_eff_solver.update_diagonal(k + gamma/(beta*self.dt) * c + 1/(beta*self.dt**2) * m)
+                a_eff.set_diagonal(tlcdDofs, 1/(beta*self.dt) * m + gamma/beta * c)
+                b_eff.set_diagonal(tlcdDofs, 1/(2*beta) * m + self.dt * ((gamma/(2*beta)) - 1) * c)
+
+            np.subtract(f[i + 1], f[i], out=dp_eff)
+            a_eff.dot(v[i], aux)
+            dp_eff += aux
+            b_eff.dot(a[i], aux)
+            dp_eff += aux
+            dx = k_eff_solver.solve(dp_eff)
+
+            np.add(x[i], dx, out=x[i + 1])
+            np.multiply(gamma/(beta*self.dt), dx, out=v[i + 1])
+            v[i + 1] += (1 - gamma/beta) * v[i]
+            v[i + 1] += self.dt * (1 - (gamma/(2*beta))) * a[i]
+            np.multiply(1/(beta*self.dt**2), dx, out=a[i + 1])
+            a[i + 1] -= 1/(beta*self.dt) * v[i]
+            a[i + 1] += (1 - 1/(2*beta)) * a[i]
+
+            if self.steady_state_reached(i + 1):
+                self.truncate(i + 2)
+                break
+
+        if nonlinear and len(self.t) > 2:
+            self.store_tlcd_damping()
+
+    def newmark_matrices(self, gamma, beta):
+        """ Assembles the incremental Newmark matrices for the current damping matrix.
+
+        :param gamma: float - Newmark gamma parameter.
+        :param beta: float - Newmark beta parameter.
+        :return: tuple - Effective stiffness k_eff and the velocity (a) and acceleration (b) coefficient matrices.
+        """
+        k_eff = self.K + gamma/(beta*self.dt) * self.C + 1/(beta*self.dt**2) * self.M
+        a = 1/(beta*self.dt) * self.M + gamma/beta * self.C
+        b = 1/(2*beta) * self.M + self.dt * ((gamma/(2*beta)) - 1) * self.C
+        return k_eff, a, b
+
+    def tlcd_dofs(self):
+        """ Indexes of the TLCD DOFs, which are assembled after the stories.
+
+        :return: list - Indexes of the TLCD DOFs.
+        """
+        n = self.C.shape[1]
+        return list(range(n - self.tlcd.amount, n))
 
-            k_eff = self.K + gamma/(beta*self.dt) * self.C + 1/(beta*self.dt**2) * self.M
-            a = 1/(beta*self.dt) * self.M + gamma/beta * self.C
-            b = 1/(2*beta) * self.M + self.dt * ((gamma/(2*beta)) - 1) * self.C
+    def store_tlcd_damping(self):
+        """ Writes tlcdDamping into the TLCD diagonal entries of the damping matrix.
 
-            dp_eff = (self.F[:, i+1] - self.F[:, i]) + (a * self.v[:, i]) + (b * self.a[:, i])
-            dx = k_eff.I * dp_eff
-            dv = gamma/(beta * self.dt)*dx - gamma/beta*self.v[:, i] + self.dt * (1 - (gamma/(2*beta))) * self.a[:, i]
-            da = 1/(beta*self.dt**2)*dx - 1/(beta*self.dt)*self.v[:, i] - 1/(2*beta)*self.a[:, i]
-            
-            self.x[:, i+1] = self.x[:, i] + dx
-            self.v[:, i+1] = self.v[:, i] + dv
-            self.a[:, i+1] = self.a[:, i] + da
+        :return: None
+        """
+        self.C = replace_diagonal(self.C, self.tlcd_dofs(), self.tlcdDamping)
 
-    
     def damping_update_nm(self, i):
-        correctionStart = self.C.shape[1] - 1
-        correctionStop = correctionStart - self.tlcd.amount
+        """ Updates tlcdDamping, the nonlinear damping coefficient of the TLCDs, from the velocity of the last DOF.
 
-        if i >= 1:
-            velocity = abs(self.v[-1, i])
-        else:
-            velocity = abs(self.v[-1, 0])
+        :param i: int - Index of the time step.
+        :return: None
+        """
+        velocity = abs(self.velocity[i, -1])
 
         correctionFactor = self.tlcd.calculate_damping_correction_factor(velocity)
         contractionDampingCoefficient = self.tlcd.calculate_contraction_damping(velocity)
-
-        for j in range(correctionStart, correctionStop, -1):
-            self.C[j, j] = self.tlcd.dampingCoefficientConstant * correctionFactor
-            self.C[j, j] += contractionDampingCoefficient
-            # print(velocity)
-            # print(self.tlcd.dampingCoefficientConstant, correctionFactor, contractionDampingCoefficient)
-            # print(self.C[j, j])
+        self.tlcdDamping = self.tlcd.dampingCoefficientConstant * correctionFactor + contractionDampingCoefficient
 
     def rk4_solver(self, nonlinear=False):
-        self.unpack()
+        self.unpack(lazyForce=True)
+
+        n = self.M.shape[0]
+        x = self.displacement
+        v = self.velocity
+        a = self.acceleration
+
+        # First order system z' = A * z + [0, M^-1 * F] with the state z = [x, v]
+        massSolver = factorize(self.M)
+        self.MinvK = massSolver.solve(self.K)
+        self.MinvC = massSolver.solve(self.C)
+        if isinstance(self.forceHistory, LowRankForce):
+            self.MinvF = LowRankForce(self.forceHistory.left, massSolver.solve(self.forceHistory.right.T).T)
+        else:
+            self.MinvF = np.ascontiguousarray(massSolver.solve(self.forceHistory.T).T)
 
-        for i in list(range(0, len(self.t[1:]) - 1)):
+        A = np.zeros((2 * n, 2 * n))
+        A[:n, n:] = np.eye(n)
+        A[n:, :n] = -self.MinvK
+        A[n:, n:] = -self.MinvC
+
+        if nonlinear:
+            # Only the TLCD diagonal entries of C change, so only their columns of M^-1 * C are updated
+            tlcdDofs = self.tlcd_dofs()
+            tlcdColumns = [n + j for j in tlcdDofs]
+            C_fixed = replace_diagonal(self.C, tlcdDofs, 0.)
+            MinvC_fixed = massSolver.solve(C_fixed[:, tlcdDofs])
+            Minv_tlcd = massSolver.solve(np.eye(n)[:, tlcdDofs])
+
+        z = np.empty(2 * n)
+        zStage = np.empty(2 * n)
+        k1 = np.empty(2 * n)
+        k2 = np.empty(2 * n)
+        k3 = np.empty(2 * n)
+        k4 = np.empty(2 * n)
+
+        for i in range(0, len(self.t) - 2):
             if nonlinear:
                 self.damping_update_nm(i)
+                self.MinvC[:, tlcdDofs] = MinvC_fixed + Minv_tlcd * self.tlcdDamping
+                A[n:, tlcdColumns] = -self.MinvC[:, tlcdDofs]
+
+            z[:n] = x[i]
+            z[n:] = v[i]
+            MinvF = self.MinvF[i]
 
             # First point
-            t = self.t[i]
-            x = self.x[:, i]
-            y1 = self.v[:, i]
-            y1_ = self.M.I * (self.F[:, i] - self.C * y1 - self.K * x)
+            np.dot(A, z, out=k1)
+            k1[n:] += MinvF
 
             # Second point
-            t = self.t[i] + self.dt/2
-            x = self.x[:, i] + self.dt/2 * y1
-            y2 = self.v[:, i] + self.dt/2 * y1_
-            y2_ = self.M.I * (self.F[:, i] - self.C * y2 - self.K * x)
+            np.multiply(k1, self.dt/2, out=zStage)
+            zStage += z
+            np.dot(A, zStage, out=k2)
+            k2[n:] += MinvF
 
             # Third point
-            t = self.t[i] + self.dt/2
-            x = self.x[:, i] + self.dt/2 * y2
-            y3 = self.v[:, i] + self.dt/2 * y2_
-            y3_ = self.M.I * (self.F[:, i] - self.C * y3 - self.K * x)
+            np.multiply(k2, self.dt/2, out=zStage)
+            zStage += z
+            np.dot(A, zStage, out=k3)
+            k3[n:] += MinvF
 
             # Fourth point
-            t = self.t[i] + self.dt
-            x = self.x[:, i] + self.dt * y3
-            y4 = self.v[:, i] + self.dt * y3_
-            y4_ = self.M.I * (self.F[:, i] - self.C * y4 - self.K * x)
+            np.multiply(k3, self.dt, out=zStage)
+            zStage += z
+            np.dot(A, zStage, out=k4)
+            k4[n:] += MinvF
 
             # Update
-            self.x[:, i+1] = self.x[:, i] + self.dt/6 * (y1 + 2*y2 + 2*y3 + y4)
-            self.v[:, i+1] = self.v[:, i] + self.dt/6 * (y1_ + 2*y2_ + 2*y3_ + y4_)
+            k2 += k3
+            k2 *= 2
+            k2 += k1
+            k2 += k4
+            k2 *= self.dt/6
+            z += k2
+
+            a[i] = k1[n:]
+            x[i + 1] = z[:n]
+            v[i + 1] = z[n:]
+
+            if self.steady_state_reached(i + 1):
+                self.truncate(i + 2)
+                break
+
+        if nonlinear and len(self.t) > 2:
+            self.store_tlcd_damping()
+
+    def expm_solver(self, holdOrder=1):
+        """ Exact discrete-time solver for linear systems. The state z = [x, v] is propagated by
+        z[i + 1] = Phi * z[i] + G0 * F[i] + G1 * F[i + 1], where Phi = expm(A * dt) and the input matrices come from the
+        exponential of an augmented matrix, so the only error is the hold assumption of the force between time steps.
+        The scheme is unconditionally stable, so the time step is only limited by the accuracy wanted.
+
+        :param holdOrder: int - 0 for a force constant along each time step (zero-order hold), 1 for a force linearly
+        interpolated between time steps (first-order hold).
+        :return: None
+        """
+        self.unpack()
+
+        n = self.M.shape[0]
+        x = self.displacement
+        v = self.velocity
+        f = self.forceHistory
+
+        massSolver = factorize(self.M)
+        stateMatrix = np.zeros((2 * n, 2 * n))
+        stateMatrix[:n, n:] = np.eye(n)
+        stateMatrix[n:, :n] = -massSolver.solve(self.K)
+        stateMatrix[n:, n:] = -massSolver.solve(self.C)
+        inputMatrix = np.zeros((2 * n, n))
+        inputMatrix[n:] = massSolver.solve(np.eye(n))
+        self.Phi, gamma0, gamma1 = discrete_propagator(stateMatrix, inputMatrix, self.dt)
+
+        # Force contribution of every time step computed at once, leaving one matrix-vector product per step
+        if holdOrder == 0:
+            forcing = f[:-1] @ gamma0.T
+        else:
+            forcing = f[:-1] @ (gamma0 - gamma1).T + f[1:] @ gamma1.T
+
+        z = np.empty(2 * n)
+        z[:n] = x[0]
+        z[n:] = v[0]
+        aux = np.empty(2 * n)
+
+        for i in range(0, len(self.t) - 1):
+            np.dot(self.Phi, z, out=aux)
+            np.add(aux, forcing[i], out=z)
+            x[i + 1] = z[:n]
+            v[i + 1] = z[n:]
+
+            if self.steady_state_reached(i + 1):
+                self.truncate(i + 2)
+                x = self.displacement
+                v = self.velocity
+                f = self.forceHistory
+                break
+
+        self.acceleration = massSolver.solve((f - v @ self.C.T - x @ self.K.T).T).T
+
+    def modal_superposition_solver(self, massParticipation=0.95, holdOrder=1):
+        """ Modal superposition solver for linear systems. The system is projected on its mass normalized modes and
+        only the lowest modes that capture the given fraction of the total mass are kept. With classical damping the
+        modal equations are uncoupled and every modal coordinate is integrated by its exact discrete propagator, all
+        modes at once. TLCDs make the damping nonclassical, so then the kept modes are integrated together by the
+        propagator of the reduced system. The response is recombined at the end.
+
+        :param massParticipation: float - Fraction of the total mass captured by the modes kept.
+        :param holdOrder: int - 0 for a force constant along each time step (zero-order hold), 1 for a force linearly
+        interpolated between time steps (first-order hold).
+        :return: None
+        """
+        self.unpack()
+
+        eigenvalues, modes = eigh(self.K, self.M)
+        influence = assemble_influence_vector(self.M.shape[0], self.tlcd)
+        participation = modes.T @ self.M @ influence
+        effectiveMass = np.cumsum(participation ** 2) / (influence @ self.M @ influence)
+        k = min(int(np.searchsorted(effectiveMass, massParticipation - 1e-12)) + 1, len(eigenvalues))
+
+        self.modes = modes[:, :k]
+        self.naturalFrequencies = np.sqrt(np.abs(eigenvalues[:k]))
+        modalStiffness = self.naturalFrequencies ** 2
+        modalDamping = self.modes.T @ self.C @ self.modes
+        p = self.forceHistory @ self.modes
+
+        q = np.zeros((len(self.t), k))
+        qd = np.zeros((len(self.t), k))
+        q[0] = self.modes.T @ self.M @ self.displacement[0]
+        qd[0] = self.modes.T @ self.M @ self.velocity[0]
+
+        uncoupledDamping = np.diagonal(modalDamping)
+        classical = np.allclose(modalDamping - np.diag(uncoupledDamping), 0.,
+                                atol=1e-8 * np.max(np.abs(uncoupledDamping), initial=0.))
+
+        if classical:
+            # Each mode follows q'' + c * q' + w^2 * q = p, with its 2 by 2 propagator stored along the last axis
+            phi = np.empty((2, 2, k))
+            gamma0 = np.empty((2, k))
+            gamma1 = np.empty((2, k))
+            for j in range(k):
+                stateMatrix = np.array([[0., 1.], [-modalStiffness[j], -uncoupledDamping[j]]])
+                phi[:, :, j], g0, g1 = discrete_propagator(stateMatrix, np.array([[0.], [1.]]), self.dt)
+                gamma0[:, j] = g0[:, 0]
+                gamma1[:, j] = g1[:, 0]
+
+            if holdOrder == 0:
+                forcing = p[:-1, np.newaxis, :] * gamma0
+            else:
+                forcing = p[:-1, np.newaxis, :] * (gamma0 - gamma1) + p[1:, np.newaxis, :] * gamma1
 
+            for i in range(0, len(self.t) - 1):
+                q[i + 1] = phi[0, 0] * q[i] + phi[0, 1] * qd[i] + forcing[i, 0]
+                qd[i + 1] = phi[1, 0] * q[i] + phi[1, 1] * qd[i] + forcing[i, 1]
+        else:
+            stateMatrix = np.zeros((2 * k, 2 * k))
+            stateMatrix[:k, k:] = np.eye(k)
+            stateMatrix[k:, :k] = -np.diag(modalStiffness)
+            stateMatrix[k:, k:] = -modalDamping
+            inputMatrix = np.zeros((2 * k, k))
+            inputMatrix[k:] = np.eye(k)
+            phi, gamma0, gamma1 = discrete_propagator(stateMatrix, inputMatrix, self.dt)
+
+            if holdOrder == 0:
+                forcing = p[:-1] @ gamma0.T
+            else:
+                forcing = p[:-1] @ (gamma0 - gamma1).T + p[1:] @ gamma1.T
+
+            z = np.concatenate((q[0], qd[0]))
+            aux = np.empty(2 * k)
+            for i in range(0, len(self.t) - 1):
+                np.dot(phi, z, out=aux)
+                np.add(aux, forcing[i], out=z)
+                q[i + 1] = z[:k]
+                qd[i + 1] = z[k:]
+
+        qdd = p - qd @ modalDamping.T - modalStiffness * q
+        self.displacement = q @ self.modes.T
+        self.velocity = qd @ self.modes.T
+        self.acceleration = qdd @ self.modes.T
+
+    def frequency_domain_solver(self, decayRatio=1e-6, chunkSize=2 ** 21):
+        """ Frequency domain solver for linear systems. The force history is zero padded to twice its length and
+        transformed by FFT, the response at each frequency bin is X = (K + s * C + s^2 * M)^-1 * F, solved for chunks
+        of bins at once, and the displacement, velocity and acceleration come back by inverse FFT.
+
+        Lightly damped systems (e.g. TLCDs) still vibrate at the end of the padding, which would wrap around into the
+        beginning of the response. So the force is multiplied by exp(-sigma * t) before the FFT, the system is solved
+        at the complex frequency s = sigma + i * w and the response is multiplied back by exp(sigma * t), which damps
+        the wrapped part by decayRatio without changing the result.
+
+        The FFT response starts from rest, so nonzero initial conditions add the free vibration of the system, from
+        the eigenvalues of its state matrix.
+
+        :param decayRatio: float - Attenuation of the response wrapped around the padded record.
+        :param chunkSize: int - Maximum number of matrix entries of each chunk of batched solves.
+        :return: None
+        """
+        self.unpack()
 
-    def modal_superposition_solver(self):
-        pass
+        n = self.M.shape[0]
+        numberOfSteps = self.forceHistory.shape[0]
+        numberOfPoints = next_fast_len(2 * numberOfSteps, real=True)
+        t = np.array(self.t)
+
+        sigma = np.log(1 / decayRatio) / (numberOfPoints * self.dt)
+        window = np.exp(-sigma * t)[:, np.newaxis]
+        force = rfft(self.forceHistory * window, n=numberOfPoints, axis=0)
+        s = sigma + 2j * np.pi * rfftfreq(numberOfPoints, self.dt)
+
+        response = np.empty_like(force)
+        binsPerChunk = max(chunkSize // (n * n), 1)
+        for start in range(0, s.shape[0], binsPerChunk):
+            chunk = slice(start, start + binsPerChunk)
+            sChunk = s[chunk, np.newaxis, np.newaxis]
+            dynamicStiffness = self.K + sChunk * self.C + sChunk ** 2 * self.M
+            response[chunk] = np.linalg.solve(dynamicStiffness, force[chunk, :, np.newaxis])[..., 0]
+
+        s = s[:, np.newaxis]
+        self.displacement = irfft(response, n=numberOfPoints, axis=0)[:numberOfSteps] / window
+        self.velocity = irfft(s * response, n=numberOfPoints, axis=0)[:numberOfSteps] / window
+        self.acceleration = irfft(s ** 2 * response, n=numberOfPoints, axis=0)[:numberOfSteps] / window
+
+        if np.any(self.x0) or np.any(self.v0):
+            massSolver = factorize(self.M)
+            stateMatrix = np.zeros((2 * n, 2 * n))
+            stateMatrix[:n, n:] = np.eye(n)
+            stateMatrix[n:, :n] = -massSolver.solve(self.K)
+            stateMatrix[n:, n:] = -massSolver.solve(self.C)
+            eigenvalues, eigenvectors = eig(stateMatrix)
+
+            z0 = np.concatenate((np.broadcast_to(self.x0, (n,)), np.broadcast_to(self.v0, (n,))))
+            modalState = np.exp(np.outer(t, eigenvalues)) * np.linalg.solve(eigenvectors, z0)
+            freeState = modalState @ eigenvectors.T
+            self.displacement += freeState[:, :n].real
+            self.velocity += freeState[:, n:].real
+            self.acceleration += ((modalState * eigenvalues) @ eigenvectors.T)[:, n:].real
 
     def plot_displacement(self):
-        plt.plot(self.t, self.x[0].A1, 'r-')
-        # plt.plot(self.t, self.x[1].A1, 'b-')
+        plt.plot(self.t, self.displacement[:, 0], 'r-')
+        # plt.plot(self.t, self.displacement[:, 1], 'b-')
         #
         # plt.title('Structure/TLD Displacements\nh = %.2f m / b =  %.2f m / D = %.2f m' % (h, b, D))
         # plt.legend(['Structure Displacement', 'TLD Displacement'])
@@ -215,8 +716,8 @@ class ODESolver(object):
         plt.show()
 
     def plot_velocity(self):
-        plt.plot(self.t, self.v[0].A1, 'r-')
-        # plt.plot(self.t, self.v[1].A1, 'b-')
+        plt.plot(self.t, self.velocity[:, 0], 'r-')
+        # plt.plot(self.t, self.velocity[:, 1], 'b-')
         #
         # plt.title('Structure/TLD Velocities\nh = %.2f m / b =  %.2f m / D = %.2f m' % (h, b, D))
         # plt.legend(['Structure Velocity', 'TLD Velocity'])
@@ -226,8 +727,8 @@ class ODESolver(object):
         plt.show()
 
     def plot_acceleration(self):
-        plt.plot(self.t, self.a[0].A1, 'r-')
-        # plt.plot(self.t, self.a[1].A1, 'b-')
+        plt.plot(self.t, self.acceleration[:, 0], 'r-')
+        # plt.plot(self.t, self.acceleration[:, 1], 'b-')
         #
         # plt.title('Structure/TLD Accelerations\nh = %.2f m / b =  %.2f m / D = %.2f m' % (h, b, D))
         # plt.legend(['Structure Acceleration', 'TLD Acceleration'])
@@ -237,177 +738,548 @@ class ODESolver(object):
         plt.show()
 
 
-def assemble_mass_matrix(stories, tlcd):
+def assemble_mass_matrix(stories, tlcd, sparse=False):
     """ Function that takes a dictionary of building story objects and a tlcd object to return its mass matrix.
 
-    :param stories: dict - Dictionary of objects containing data of each story of the building.
+    :param stories: dict - Dictionary of objects containing data of each story of the building, or a StructureModel.
     :param tlcd: object - Data of the building tlcd.
-    :return: np.matrix - Mass matrix of the building equipped with tlcd.
+    :param sparse: bool - Whether a scipy.sparse CSC matrix is returned instead of a dense one.
+    :return: np.ndarray - Mass matrix of the building equipped with tlcd.
     """
+    diagonal = np.array(as_structure_model(stories).mass)
     if tlcd is None:
-        n = len(stories)
+        return assemble_sparse_matrix(diagonal, [], [], [], sparse)
 
-        M = np.mat(np.zeros((n, n)))
+    lastStory = len(stories) - 1
+    tlcdDofs = np.arange(lastStory + 1, lastStory + 1 + tlcd.amount)
+    diagonal[lastStory] += tlcd.mass * tlcd.amount
+    diagonal = np.concatenate((diagonal, np.full(tlcd.amount, float(tlcd.mass))))
+    coupling = np.full(tlcd.amount, (tlcd.width / tlcd.length) * tlcd.mass)
+    rows = np.concatenate((tlcdDofs, np.full(tlcd.amount, lastStory)))
+    cols = np.concatenate((np.full(tlcd.amount, lastStory), tlcdDofs))
+    return assemble_sparse_matrix(diagonal, rows, cols, np.concatenate((coupling, coupling)), sparse)
 
-        for i in range(n):
-            M[i, i] = stories[i + 1].mass
-    else:
-        lastStory = len(stories) - 1
-        n = len(stories) + tlcd.amount
 
-        M = np.mat(np.zeros((n, n)))
+def assemble_damping_matrix(stories, tlcd, sparse=False):
+    """ Function that takes a dictionary of building story objects and a tlcd object to return its damping matrix.
 
-        for i in range(lastStory + 1):
-            M[i, i] = stories[i + 1].mass
+    :param stories: dict - Dictionary of objects containing data of each story of the building, or a StructureModel.
+    :param tlcd: object - Data of the building tlcd.
+    :param sparse: bool - Whether a scipy.sparse CSC matrix is returned instead of a dense one.
+    :return: np.ndarray - Damping matrix of the building equiped with tlcd.
+    """
+    structure = as_structure_model(stories)
+    if structure.dampingCoefficient is None:
+        raise AttributeError('The stories have no dampingCoefficient. Call calc_damping_coefficient on each of them '
+                             'first.')
+    diagonal = np.array(structure.dampingCoefficient, dtype=float)
+    if tlcd is not None:
+        diagonal = np.concatenate((diagonal, np.full(tlcd.amount, float(tlcd.dampingCoefficient))))
+    return assemble_sparse_matrix(diagonal, [], [], [], sparse)
 
-        M[lastStory, lastStory] += tlcd.mass * tlcd.amount
-        for i in range(lastStory + 1, n):
-            M[i, i] = tlcd.mass
-            M[i, lastStory] = (tlcd.width / tlcd.length) * tlcd.mass
-            M[lastStory, i] = (tlcd.width / tlcd.length) * tlcd.mass
 
-        # M[n - 1, n - 1] += tlcd.mass
-        # M[n, n] = tlcd.mass
-        # M[n, n - 1] = (tlcd.width / tlcd.length) * tlcd.mass
-        # M[n - 1, n] = (tlcd.width / tlcd.length) * tlcd.mass
+def assemble_stiffness_matrix(stories, tlcd, sparse=False):
+    """ Function that takes a dictionary of building story objects and a tlcd object to return its stiffness matrix.
 
-    return M
+    :param stories: dict - Dictionary of objects containing data of each story of the building, or a StructureModel.
+    :param tlcd: object - Data of the building tlcd.
+    :param sparse: bool - Whether a scipy.sparse CSC matrix is returned instead of a dense one.
+    :return: np.ndarray - Stiffness matrix of the building equiped with tlcd.
+    """
+    storyStiffness = as_structure_model(stories).stiffness
+
+    # Each story spring couples its floor to the floor below
+    diagonal = storyStiffness.copy()
+    diagonal[:-1] += storyStiffness[1:]
+    lower = np.arange(len(stories) - 1)
+    coupling = -storyStiffness[1:]
+    rows = np.concatenate((lower + 1, lower))
+    cols = np.concatenate((lower, lower + 1))
+    if tlcd is not None:
+        diagonal = np.concatenate((diagonal, np.full(tlcd.amount, float(tlcd.stiffness))))
+    return assemble_sparse_matrix(diagonal, rows, cols, np.concatenate((coupling, coupling)), sparse)
+
+
+def assemble_sparse_matrix(diagonal, rows, cols, values, sparse=False):
+    """ Function that assembles a square matrix from its diagonal and its off-diagonal entries in coordinate format,
+    so large models are built without looping over the stories or allocating the dense matrix.
+
+    :param diagonal: np.ndarray - n sized main diagonal.
+    :param rows: np.ndarray - Rows of the off-diagonal entries.
+    :param cols: np.ndarray - Columns of the off-diagonal entries.
+    :param values: np.ndarray - Off-diagonal entries, each one set only once.
+    :param sparse: bool - Whether a scipy.sparse CSC matrix is returned instead of a dense np.ndarray.
+    :return: np.ndarray - n by n sized matrix.
+    """
+    n = diagonal.shape[0]
+    rows = np.concatenate((np.arange(n), np.asarray(rows, dtype=int)))
+    cols = np.concatenate((np.arange(n), np.asarray(cols, dtype=int)))
+    values = np.concatenate((diagonal, np.asarray(values, dtype=float)))
+    matrix = coo_matrix((values, (rows, cols)), shape=(n, n))
+    if sparse:
+        return matrix.tocsc()
+    return matrix.toarray()
 
 
-def assemble_damping_matrix(stories, tlcd):
-    """ Function that takes a dictionary of building story objects and a tlcd object to return its damping matrix.
+def assemble_force_matrix(excitation, mass, configurations, lazy=False):
+    """ Function that takes an excitation object, a mass matrix and configurations object to return force vector
+    evaluated over time.
 
-    :param stories: dict - Dictionary of objects containing data of each story of the building.
-    :param tlcd: object - Data of the building tlcd.
-    :return: np.matrix - Damping matrix of the building equiped with tlcd.
+    Every story row is the story mass times the same ground acceleration history, and the TLCD rows follow their own
+    history, so the force matrix is the product of a few influence vectors and time histories.
+
+    :param excitation: object - Object containing type of excitation and its parameters (measured by acceleration).
+    :param mass: np.ndarray - Mass matrix of any system.
+    :param configurations: object - Object containing time step of iterations.
+    :param lazy: bool - Whether a LowRankForce holding the influence vectors and the time histories is returned
+    instead of the materialized matrix.
+    :return: np.ndarray - Force vector evaluated over time.
     """
+    tlcd = excitation.tlcd
+    step = configurations.timeStep
+    totalTimeArray = np.arange(0, excitation.anlyDuration + step, step)
+    excitationTimeArray = np.arange(0, excitation.exctDuration + step, step)
     if tlcd is None:
-        n = len(stories)
+        numberOfStories = mass.shape[0]
+    else:
+        numberOfStories = mass.shape[0] - tlcd.amount
+    storyMass = matrix_diagonal(mass)[:numberOfStories]
 
-        C = np.mat(np.zeros((n, n)))
+    if excitation.type == 'Sine Wave':
+        sine = np.sin(excitation.frequency * totalTimeArray)
+        excitationSteps = min(excitationTimeArray.shape[0], totalTimeArray.shape[0])
+
+        # The TLCD rows follow the sine over the whole analysis, not only while the excitation lasts
+        influence = np.zeros((mass.shape[0], 1 if tlcd is None else 2))
+        histories = np.zeros((influence.shape[1], totalTimeArray.shape[0]))
+        influence[:numberOfStories, 0] = storyMass * excitation.amplitude
+        histories[0, :excitationSteps] = sine[:excitationSteps]
+        if tlcd is not None:
+            influence[numberOfStories:, 1] = tlcd.width/tlcd.length * tlcd.mass * excitation.amplitude
+            histories[1] = sine
+    elif excitation.type == 'General Excitation':
+        influence = np.empty((mass.shape[0], 1))
+        influence[:numberOfStories, 0] = storyMass
+        if tlcd is not None:
+            influence[numberOfStories:, 0] = tlcd.width/tlcd.length * tlcd.mass
+        histories = resample_excitation(excitation, totalTimeArray, configurations)[np.newaxis, :]
+
+    force = LowRankForce(influence, histories)
+    if lazy:
+        return force
+    return np.asarray(force)
+
+
+def resample_excitation(excitation, time, configurations):
+    """ Function that returns the acceleration record of a General Excitation resampled onto the times of the analysis
+    (see resample_record). The resampled records are kept in resampledRecordCache, keyed by the content of the record,
+    the time step and the durations, so analyses that only change the structure, the TLCD or the solution method reuse
+    them. The content is keyed by the excitation.recordHash computed when the excitation is created, so a cache hit
+    neither reads nor hashes the record.
+
+    :param excitation: object - General Excitation object, with the record in m/s**2.
+    :param time: np.ndarray - Times of the analysis, from 0 to excitation.anlyDuration by configurations.timeStep.
+    :param configurations: object - Object containing time step of iterations and the memory cap of the cache.
+    :return: np.ndarray - Read-only acceleration at the times of the analysis.
+    """
+    recordHash = getattr(excitation, 'recordHash', None)
+    if recordHash is None:
+        recordHash = content_hash(excitation.t_input, excitation.a_input)
+    key = (recordHash, configurations.timeStep, excitation.anlyDuration, excitation.exctDuration)
+
+    resampledRecordCache.resize(configurations.excitationCacheSize)
+    acceleration = resampledRecordCache.get(key)
+    if acceleration is None:
+        acceleration = resample_record(excitation.t_input, excitation.a_input, time, excitation.exctDuration)
+        acceleration = resampledRecordCache.put(key, acceleration)
+    return acceleration
+
+
+def resample_record(t, a, time, duration=None):
+    """ Function that linearly interpolates a record sampled at any times (e.g. an accelerogram) onto the times of
+    the analysis. The record is zero before its first sample, after its last one and after the given duration.
+
+    :param t: list - Sampling times of the record, in any order.
+    :param a: list - Samples of the record.
+    :param time: np.ndarray - Times of the analysis.
+    :param duration: float - Time after which the record is zero. The whole record is used if None.
+    :return: np.ndarray - Record at the times of the analysis.
+    """
+    t = np.asarray(t, dtype=float)
+    a = np.asarray(a, dtype=float)
+    if np.any(np.diff(t) < 0):
+        order = np.argsort(t, kind='stable')
+        t, a = t[order], a[order]
 
-        for i in range(n):
-            C[i, i] = stories[i + 1].dampingCoefficient
-    else:
-        lastStory = len(stories) - 1
-        n = len(stories) + tlcd.amount
+    time = np.asarray(time, dtype=float)
+    end = t[-1] if duration is None else min(duration, t[-1])
+    resampled = np.interp(time, t, a, left=0.)
 
-        C = np.mat(np.zeros((n, n)))
+    # The round-off of the times of the analysis must not drop the last sample
+    resampled[time > end + 1e-9 * max(abs(end), 1.)] = 0.
+    return resampled
 
-        for i in range(lastStory + 1):
-            C[i, i] = stories[i + 1].dampingCoefficient
 
-        for i in range(lastStory + 1, n):
-            C[i, i] = tlcd.dampingCoefficient
+def assemble_force_amplitude_vector(excitation, mass):
+    """ Function that takes a sine wave excitation object and a mass matrix to return the amplitude of the force at each
+    DOF, i.e. the rows of assemble_force_matrix before they are multiplied by the sine.
 
-    return C
+    :param excitation: object - Object containing the sine wave parameters (measured by acceleration).
+    :param mass: np.ndarray - Mass matrix of any system.
+    :return: np.ndarray - Force amplitude vector.
+    """
+    if not issparse(mass):
+        mass = np.asarray(mass, dtype=float)
+    return excitation.amplitude * (mass @ assemble_influence_vector(mass.shape[0], excitation.tlcd))
+
+
+def frequency_response(mass, damping, stiffness, forceAmplitude, frequencies, chunkSize=2 ** 21,
+                       dampingDiagonal=None):
+    """ Function that returns the complex steady-state amplitude X = (K - w^2 * M + i * w * C)^-1 * F of a linear
+    system under a harmonic force at each frequency, solved for chunks of frequencies at once. Sparse systems are
+    solved one frequency at a time by the sparse LU instead.
+
+    :param mass: np.ndarray - Mass matrix of any system.
+    :param damping: np.ndarray - Damping matrix of any system.
+    :param stiffness: np.ndarray - Stiffness matrix of any system.
+    :param forceAmplitude: np.ndarray - n sized force amplitude vector.
+    :param frequencies: np.ndarray - Frequencies of the harmonic force (rad/s).
+    :param chunkSize: int - Maximum number of matrix entries of each chunk of batched solves.
+    :param dampingDiagonal: np.ndarray - Frequencies by n sized values added to the diagonal of the damping matrix at
+    each frequency (e.g. the equivalent TLCD damping). Nothing is added if None.
+    :return: np.ndarray - Frequencies by n sized complex displacement amplitudes.
+    """
+    w = np.asarray(frequencies, dtype=float)
+
+    if any(issparse(matrix) for matrix in (mass, damping, stiffness)):
+        mass, damping, stiffness = csc_matrix(mass), csc_matrix(damping), csc_matrix(stiffness)
+        response = np.empty((w.shape[0], mass.shape[0]), dtype=complex)
+        forceAmplitude = np.asarray(forceAmplitude, dtype=complex)
+        for k in range(w.shape[0]):
+            dynamicStiffness = stiffness - w[k] ** 2 * mass + 1j * w[k] * damping
+            if dampingDiagonal is not None:
+                dynamicStiffness = dynamicStiffness + diags(1j * w[k] * dampingDiagonal[k])
+            response[k] = splu(csc_matrix(dynamicStiffness)).solve(forceAmplitude)
+        return response
+
+    mass = np.asarray(mass, dtype=float)
+    damping = np.asarray(damping, dtype=float)
+    stiffness = np.asarray(stiffness, dtype=float)
+    n = mass.shape[0]
+
+    response = np.empty((w.shape[0], n), dtype=complex)
+    forceAmplitude = np.asarray(forceAmplitude, dtype=complex)[:, np.newaxis]
+    step = max(chunkSize // (n * n), 1)
+    for start in range(0, w.shape[0], step):
+        wChunk = w[start:start + step, np.newaxis, np.newaxis]
+        dynamicStiffness = stiffness - wChunk ** 2 * mass + 1j * wChunk * damping
+        if dampingDiagonal is not None:
+            dofs = np.arange(n)
+            dynamicStiffness[:, dofs, dofs] += 1j * wChunk[:, :, 0] * dampingDiagonal[start:start + step]
+        rhs = np.broadcast_to(forceAmplitude, (dynamicStiffness.shape[0], n, 1))
+        response[start:start + step] = np.linalg.solve(dynamicStiffness, rhs)[..., 0]
+    return response
+
+
+def steady_state_dmf(mass, damping, stiffness, forceAmplitude, frequencies, dampingDiagonal=None):
+    """ Function that returns the steady-state displacement amplitude and dynamic magnification factor of each
+    loaded DOF over a set of frequencies, with the same static displacement used by OutputData.calc_dmf.
+
+    :param mass: np.ndarray - Mass matrix of any system.
+    :param damping: np.ndarray - Damping matrix of any system.
+    :param stiffness: np.ndarray - Stiffness matrix of any system.
+    :param forceAmplitude: np.ndarray - n sized force amplitude vector.
+    :param frequencies: np.ndarray - Frequencies of the harmonic force (rad/s).
+    :param dampingDiagonal: np.ndarray - Frequencies by n sized values added to the diagonal of the damping matrix at
+    each frequency. Nothing is added if None.
+    :return: tuple - Frequencies by loaded DOFs sized arrays of maximum displacements and DMFs.
+    """
+    forceAmplitude = np.asarray(forceAmplitude, dtype=float)
+    loaded = forceAmplitude != 0
+    response = frequency_response(mass, damping, stiffness, forceAmplitude, frequencies,
+                                  dampingDiagonal=dampingDiagonal)
+    displacement = np.absolute(response)[:, loaded]
+    staticDisplacement = np.absolute(forceAmplitude) / matrix_diagonal(stiffness)
+    return displacement, displacement / staticDisplacement[loaded]
 
 
-def assemble_stiffness_matrix(stories, tlcd):
-    """ Function that takes a dictionary of building story objects and a tlcd object to return its stiffness matrix.
+def tlcd_damping_coefficient(tlcd, velocity):
+    """ Function that returns the nonlinear damping coefficient of the TLCDs, the same diagonal entry set by the time
+    stepping methods, for each liquid velocity of an array.
 
-    :param stories: dict - Dictionary of objects containing data of each story of the building.
     :param tlcd: object - Data of the building tlcd.
-    :return: np.matrix - Stiffness matrix of the building equiped with tlcd.
+    :param velocity: np.ndarray - Liquid velocities.
+    :return: np.ndarray - Damping coefficients.
     """
-    if tlcd is None:
-        n = len(stories)
+    speed = np.absolute(np.asarray(velocity, dtype=float))
+    return (tlcd.dampingCoefficientConstant * tlcd.calculate_damping_correction_factor(speed) +
+            tlcd.calculate_contraction_damping(speed))
 
-        K = np.mat(np.zeros((n, n)))
 
-        for i in range(n):
-            K[i, i] = stories[i + 1].stiffness
+def equivalent_damping_coefficient(tlcd, velocity):
+    """ Function that returns the energy-equivalent linear damping coefficient of the nonlinear TLCD damping, the one
+    that dissipates the same energy over a velocity history: sum(c(|v|) * v^2) / sum(v^2).
 
-        for i in range(n, 1, -1):
-            K[i - 1, i - 2] = -stories[i].stiffness
-            K[i - 2, i - 1] = -stories[i].stiffness
-            K[i - 2, i - 2] += stories[i].stiffness
-    else:
-        lastStory = len(stories) - 1
-        n = len(stories) + tlcd.amount
+    :param tlcd: object - Data of the building tlcd.
+    :param velocity: np.ndarray - Liquid velocity samples along the last axis (e.g. over one period of a harmonic
+    motion or along a time history).
+    :return: np.ndarray - Equivalent damping coefficient (zero if the liquid does not move).
+    """
+    velocity = np.asarray(velocity, dtype=float)
+    energy = np.sum(velocity ** 2, axis=-1)
+    dissipated = np.sum(tlcd_damping_coefficient(tlcd, velocity) * velocity ** 2, axis=-1)
+    return np.divide(dissipated, energy, out=np.zeros_like(energy), where=energy > 0)
 
-        K = np.mat(np.zeros((n, n)))
 
-        for i in range(lastStory + 1):
-            K[i, i] = stories[i + 1].stiffness
+def initial_equivalent_damping(tlcd):
+    """ Function that returns the starting guess of the equivalent linearization: 5% of the critical damping of the
+    TLCD alone.
 
-        for i in range(lastStory + 1, 1, -1):
-            K[i - 1, i - 2] = -stories[i].stiffness
-            K[i - 2, i - 1] = -stories[i].stiffness
-            K[i - 2, i - 2] += stories[i].stiffness
+    :param tlcd: object - Data of the building tlcd.
+    :return: float - Damping coefficient.
+    """
+    return 0.1 * np.sqrt(tlcd.stiffness * tlcd.mass)
 
-        for i in range(lastStory + 1, n):
-            K[i, i] = tlcd.stiffness
 
-    return K
+def update_equivalent_damping(damping, equivalentDamping, previous=None):
+    """ Function that returns the next guess of the equivalent linearization, the root of c_eq(c) - c = 0. More damping
+    means slower liquid and, since the damping grows with the velocity, a smaller c_eq, so c_eq(c) - c is decreasing:
+    the secant step is taken wherever its slope is negative and the mean of c and c_eq otherwise (which is Newton's
+    method when c_eq is inversely proportional to c, as at resonance).
 
+    :param damping: np.ndarray - Damping coefficients of the last iteration.
+    :param equivalentDamping: np.ndarray - Equivalent damping coefficients of the response of the last iteration.
+    :param previous: tuple - Damping and equivalent damping coefficients of the iteration before, or None.
+    :return: np.ndarray - New damping coefficients.
+    """
+    damping = np.asarray(damping, dtype=float)
+    equivalentDamping = np.asarray(equivalentDamping, dtype=float)
+    update = (damping + equivalentDamping) / 2
+    if previous is None:
+        return update
+
+    residual = equivalentDamping - damping
+    previousResidual = previous[1] - previous[0]
+    step = damping - previous[0]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = (residual - previousResidual) / step
+        secant = damping - residual / slope
+    valid = (slope < 0) & (secant > 0) & np.isfinite(secant)
+    return np.where(valid, secant, update)
+
+
+def equivalent_linearization(mass, damping, stiffness, forceAmplitude, frequencies, tlcd, tolerance=1e-3,
+                             maxIterations=50):
+    """ Function that replaces the nonlinear TLCD damping by its energy-equivalent linear damping coefficient at each
+    frequency of a harmonic force, the one that dissipates the same energy over a cycle of the steady-state liquid
+    velocity. Each iteration is a batched frequency_response of the frequencies that did not converge yet.
+
+    :param mass: np.ndarray - Mass matrix of the system.
+    :param damping: np.ndarray - Damping matrix of the system. Its TLCD diagonal entries are replaced.
+    :param stiffness: np.ndarray - Stiffness matrix of the system.
+    :param forceAmplitude: np.ndarray - n sized force amplitude vector.
+    :param frequencies: np.ndarray - Frequencies of the harmonic force (rad/s).
+    :param tlcd: object - Data of the building tlcd.
+    :param tolerance: float - Relative change of the equivalent damping coefficient at convergence.
+    :param maxIterations: int - Maximum number of iterations.
+    :return: tuple - Frequencies by n sized values to add to the damping diagonal (the frequency_response
+    dampingDiagonal) and whether each frequency converged.
+    """
+    if not issparse(damping):
+        damping = np.asarray(damping, dtype=float)
+    frequencies = np.asarray(frequencies, dtype=float)
+    n = damping.shape[0]
+    tlcdDofs = np.arange(n - tlcd.amount, n)
+    baseDamping = matrix_diagonal(damping)[tlcdDofs]
+    phase = np.cos(np.linspace(0, 2 * np.pi, 64, endpoint=False))
+
+    coefficient = np.full(frequencies.shape, initial_equivalent_damping(tlcd))
+    previousCoefficient = None
+    previousEquivalentDamping = np.zeros(frequencies.shape)
+    converged = np.zeros(frequencies.shape, dtype=bool)
+    dampingDiagonal = np.zeros((frequencies.shape[0], n))
+    for iteration in range(maxIterations):
+        active = np.flatnonzero(~converged)
+        if active.size == 0:
+            break
+        dampingDiagonal[active[:, np.newaxis], tlcdDofs] = coefficient[active, np.newaxis] - baseDamping
+        response = frequency_response(mass, damping, stiffness, forceAmplitude, frequencies[active],
+                                      dampingDiagonal=dampingDiagonal[active])
+        velocityAmplitude = frequencies[active] * np.absolute(response[:, -1])
+        equivalentDamping = equivalent_damping_coefficient(tlcd, velocityAmplitude[:, np.newaxis] * phase)
+
+        change = np.absolute(equivalentDamping - coefficient[active])
+        converged[active] = change <= tolerance * np.maximum(equivalentDamping, coefficient[active])
+        previous = None
+        if previousCoefficient is not None:
+            previous = (previousCoefficient[active], previousEquivalentDamping[active])
+        update = update_equivalent_damping(coefficient[active], equivalentDamping, previous)
+        previousCoefficient = coefficient.copy()
+        previousEquivalentDamping[active] = equivalentDamping
+        coefficient[active] = np.where(converged[active], coefficient[active], update)
+
+    return dampingDiagonal, converged
+
+
+def harmonic_balance(mass, damping, stiffness, forceAmplitude, frequency, tlcd=None, harmonics=3, initialGuess=None,
+                     tolerance=1e-8, maxIterations=50):
+    """ Function that returns the periodic steady state of a system with nonlinear TLCDs under a harmonic force by the
+    harmonic balance method, x = Re(sum(X[h] * exp(i * (2 * h + 1) * w * t))). The TLCD damping is odd in the
+    velocity, so only odd harmonics appear.
+
+    The structure is linear, so each harmonic is condensed onto the TLCD DOFs: X[h] = X0[h] - R[h] * G[h], with X0 the
+    linear response with a nominal linear TLCD damping c0 (see initial_equivalent_damping), R the columns of the
+    dynamic flexibility at the TLCD DOFs and G the harmonics of the nonlinear damping force in excess of c0 * v. The
+    nominal damping keeps the flexibility finite at the natural frequency of TLCD modes that are decoupled from the
+    structure (e.g. the antisymmetric motion of two equal TLCDs). G is evaluated by sampling the velocity over one
+    period (alternating frequency time), and the condensed equations are solved by Newton iterations with a finite
+    difference Jacobian and a backtracking line search. The Newton steps are least squares solutions, since the
+    Jacobian is singular along the motions of such modes while the liquid is at rest.
+
+    :param mass: np.ndarray - Mass matrix of the system.
+    :param damping: np.ndarray - Damping matrix of the system. The TLCD diagonal entries are ignored if tlcd is given.
+    :param stiffness: np.ndarray - Stiffness matrix of the system.
+    :param forceAmplitude: np.ndarray - n sized amplitude of the force F * sin(w * t).
+    :param frequency: float - Frequency of the harmonic force (rad/s).
+    :param tlcd: object - Data of the building tlcd, whose damping is nonlinear. The system is linear if None.
+    :param harmonics: int - Number of odd harmonics kept.
+    :param initialGuess: np.ndarray - Harmonics by n sized amplitudes to start from (e.g. the solution at a nearby
+    frequency). The linear response without the TLCD damping is used if None.
+    :param tolerance: float - Convergence tolerance of the residual, relative to the linear response.
+    :param maxIterations: int - Maximum number of Newton iterations.
+    :return: np.ndarray - Harmonics by n sized complex displacement amplitudes.
+    """
+    mass = dense(mass)
+    damping = np.array(dense(damping))
+    stiffness = dense(stiffness)
+    n = mass.shape[0]
+    orders = np.arange(1, 2 * harmonics, 2)
+    w = frequency * orders
+    dofs = np.arange(n - tlcd.amount, n) if tlcd is not None else np.arange(0)
+    m = dofs.size
+    nominalDamping = initial_equivalent_damping(tlcd) if tlcd is not None else 0.
+    damping[dofs, dofs] = nominalDamping
+
+    # Linear response to sin(w * t) = Re(-i * exp(i * w * t)) and dynamic flexibility columns of the TLCD DOFs
+    rhs = np.zeros((harmonics, n, 1 + m), dtype=complex)
+    rhs[0, :, 0] = -1j * np.asarray(forceAmplitude, dtype=float)
+    rhs[:, dofs, 1 + np.arange(m)] = 1.
+    wColumn = w[:, np.newaxis, np.newaxis]
+    dynamicStiffness = stiffness - wColumn ** 2 * mass + 1j * wColumn * damping
+    solution = np.linalg.solve(dynamicStiffness, rhs)
+    linearResponse = solution[:, :, 0]
+    flexibility = solution[:, :, 1:]
+    if m == 0:
+        return linearResponse
+
+    numberOfSamples = 32 * harmonics
+
+    def damping_force(z):
+        spectrum = np.zeros((numberOfSamples // 2 + 1, m), dtype=complex)
+        spectrum[orders] = 1j * w[:, np.newaxis] * z * (numberOfSamples / 2)
+        velocity = irfft(spectrum, n=numberOfSamples, axis=0)
+        force = (tlcd_damping_coefficient(tlcd, velocity[:, -1])[:, np.newaxis] - nominalDamping) * velocity
+        return rfft(force, axis=0)[orders] * (2 / numberOfSamples)
+
+    def residual(y):
+        z = (y[:harmonics * m] + 1j * y[harmonics * m:]).reshape(harmonics, m)
+        r = z - linearResponse[:, dofs] + np.einsum('hij,hj->hi', flexibility[:, dofs], damping_force(z))
+        return np.concatenate((r.real.ravel(), r.imag.ravel()))
+
+    guess = linearResponse[:, dofs] if initialGuess is None else np.asarray(initialGuess)[:, dofs]
+    y = np.concatenate((guess.real.ravel(), guess.imag.ravel()))
+    scale = max(np.max(np.absolute(linearResponse[:, dofs])), np.finfo(float).tiny)
+    step = 1e-7 * scale
+    r = residual(y)
+
+    for iteration in range(maxIterations):
+        if np.linalg.norm(r) <= tolerance * scale:
+            break
+        jacobian = np.empty((y.size, y.size))
+        for k in range(y.size):
+            yStep = y.copy()
+            yStep[k] += step
+            jacobian[:, k] = (residual(yStep) - r) / step
+        dy = np.linalg.lstsq(jacobian, -r, rcond=None)[0]
+
+        factor = 1.
+        rNew = residual(y + dy)
+        while np.linalg.norm(rNew) >= np.linalg.norm(r) and factor > 1e-4:
+            factor /= 2
+            rNew = residual(y + factor * dy)
+        y += factor * dy
+        r = rNew
+    else:
+        if np.linalg.norm(r) > tolerance * scale:
+            raise ArithmeticError('Harmonic balance did not converge at {} rad/s.'.format(frequency))
 
-def assemble_force_matrix(excitation, mass, configurations):
-    """ Function that takes an excitation object, a mass matrix and configurations object to return force vector
-    evaluated over time.
+    z = (y[:harmonics * m] + 1j * y[harmonics * m:]).reshape(harmonics, m)
+    return linearResponse - np.einsum('hij,hj->hi', flexibility, damping_force(z))
 
-    :param excitation: object - Object containing type of excitation and its parameters (measured by acceleration).
-    :param mass: np.matrix - Mass matrix of any system.
-    :param configurations: object - Object containing time step of iterations.
-    :return: np.matrix - Force vector evaluated over time.
+
+def replace_diagonal(matrix, dofs, values):
+    """ Function that returns a copy of a dense or sparse matrix with some of its diagonal entries replaced.
+
+    :param matrix: np.ndarray or scipy.sparse matrix - Any n by n sized matrix.
+    :param dofs: list - Indexes of the diagonal entries.
+    :param values: np.ndarray - New diagonal entries, in the same order as dofs, or a single value for all of them.
+    :return: np.ndarray or scipy.sparse matrix - Matrix of the same kind with the new entries.
     """
-    tlcd = excitation.tlcd
-    step = configurations.timeStep
-    totalTimeArray = np.mat(np.arange(0, excitation.anlyDuration + step, step))
-    excitationTimeArray = np.mat(np.arange(0, excitation.exctDuration + step, step))
-    force = 0. * totalTimeArray
-    if tlcd is None:
-        numberOfStories = mass.shape[0]
-    else:
-        numberOfStories = mass.shape[0] - tlcd.amount
+    if issparse(matrix):
+        matrix = matrix.tolil()
+        matrix[dofs, dofs] = values
+        return matrix.tocsc()
+    matrix = np.array(matrix, dtype=float)
+    matrix[dofs, dofs] = values
+    return matrix
+
+
+def lowest_eigenvalue(stiffness, mass):
+    """ Function that returns the lowest eigenvalue (the squared fundamental frequency) of K * phi = w^2 * M * phi,
+    found by shift-invert Lanczos iterations for large sparse systems.
+
+    :param stiffness: np.ndarray or scipy.sparse matrix - Stiffness matrix of any system.
+    :param mass: np.ndarray or scipy.sparse matrix - Mass matrix of any system.
+    :return: float - Lowest eigenvalue.
+    """
+    if issparse(stiffness) and stiffness.shape[0] >= STRUCTURED_SIZE:
+        return float(eigsh(csc_matrix(stiffness), k=1, M=csc_matrix(mass), sigma=0, which='LM',
+                           return_eigenvectors=False)[0])
+    return np.min(eigvalsh(dense(stiffness), dense(mass)))
 
-    for i in range(numberOfStories - 1):
-        force = np.concatenate((force, 0. * totalTimeArray), 0)
 
-    if excitation.type == 'Sine Wave':
-        for i in range(force.shape[0]):
-            storyMass = mass[i, i]
-            forceAmplitude = storyMass * excitation.amplitude
-            for j in range(excitationTimeArray.shape[1]):
-                force[i, j] = forceAmplitude * np.sin(excitation.frequency * totalTimeArray[0, j])
-
-        if tlcd is None:
-            return force
-        else:
-            forceAmplitudeTLCD = tlcd.width/tlcd.length * tlcd.mass * excitation.amplitude
-            forceTLCD = forceAmplitudeTLCD * np.sin(excitation.frequency * totalTimeArray[0, :])
-            for i in range(tlcd.amount):
-                force = np.concatenate((force, forceTLCD), 0)
-            return force
-    elif excitation.type == 'General Excitation':
-        a = []
-        t0 = 0
-        time = [round(t / step, 0) * step for t in list(totalTimeArray.A1)]
-        for t in time:
-            if t in excitation.t_input:
-                t0 = t
-                t0_index = excitation.t_input.index(t)
-                a.append(excitation.a_input[t0_index])
-            else:
-                t1 = excitation.t_input[t0_index + 1]
-                a0 = excitation.a_input[t0_index]
-                a1 = excitation.a_input[t0_index + 1]
-                at = ((a1 - a0) / (t1 - t0)) * (t - t0) + a0
-                a.append(at)
-
-        # print(list(zip(list(totalTimeArray.A1), a)))
-        a = np.array(a)
-        for i in range(force.shape[0]):
-            storyMass = mass[i, i]
-            force[i, :] = storyMass * a
-
-        if tlcd is None:
-            return force
-        else:
-            forceTLCD = forceAmplitudeTLCD * np.sin(excitation.frequency * totalTimeArray[0, :])
-            for i in range(tlcd.amount):
-                force = np.concatenate((force, forceTLCD), 0)
-            return force
+def assemble_influence_vector(numberOfDofs, tlcd):
+    """ Function that returns the displacement of each DOF for a unit ground displacement: one for the stories and
+    zero for the TLCDs, whose DOFs are relative to the last story.
+
+    :param numberOfDofs: int - Number of DOFs of the system, including the TLCDs.
+    :param tlcd: object - Data of the building tlcd.
+    :return: np.ndarray - Influence vector.
+    """
+    influence = np.ones(numberOfDofs)
+    if tlcd is not None:
+        influence[numberOfDofs - tlcd.amount:] = 0.
+    return influence
+
+
+def discrete_propagator(stateMatrix, inputMatrix, dt):
+    """ Function that returns the exact discrete-time matrices of z' = A * z + B * u for an input held along each time
+    step, from expm([[A*dt, B*dt, 0], [0, 0, I], [0, 0, 0]]) = [[Phi, Gamma0, Gamma1], [0, I, I], [0, 0, I]]. With a
+    zero-order hold z[i + 1] = Phi * z[i] + Gamma0 * u[i] and with a first-order hold
+    z[i + 1] = Phi * z[i] + (Gamma0 - Gamma1) * u[i] + Gamma1 * u[i + 1].
+
+    :param stateMatrix: np.ndarray - State matrix A, n by n sized.
+    :param inputMatrix: np.ndarray - Input matrix B, n by m sized.
+    :param dt: float - Time step.
+    :return: tuple - Phi, Gamma0 and Gamma1.
+    """
+    n, m = inputMatrix.shape
+    augmented = np.zeros((n + 2 * m, n + 2 * m))
+    augmented[:n, :n] = stateMatrix * dt
+    augmented[:n, n:n + m] = inputMatrix * dt
+    augmented[n:n + m, n + m:] = np.eye(m)
+    exponential = expm(augmented)
+    return np.ascontiguousarray(exponential[:n, :n]), exponential[:n, n:n + m], exponential[:n, n + m:]
 
 
 def get_eigenvec_eigenval(mass, stiffness):
@@ -416,9 +1288,9 @@ def get_eigenvec_eigenval(mass, stiffness):
 
 
 def assemble_modal_matrices(modes, mass, stiffness, force):
-    Mi = modes.T * mass * modes
-    Ki = modes.T * stiffness * modes
-    Fi = modes.T * force
+    Mi = modes.T @ mass @ modes
+    Ki = modes.T @ stiffness @ modes
+    Fi = modes.T @ force
 
     return Mi, Ki, Fi
 
@@ -498,9 +1370,9 @@ if __name__ == '__main__':
                                           configurations=config_nonlinear, tlcd=tlcd_nonlinear)
 
     t = dynamicResponse_nonlinear.t
-    vc = -dynamicResponse_nonlinear.dampingVelocityArray[-1, :].A1
-    vd = dynamicResponse_nonlinear.v[-1, :].A1
-    vl = dynamicResponse_linear.v[-1, :].A1
+    vc = -dynamicResponse_nonlinear.dampingVelocityArray
+    vd = dynamicResponse_nonlinear.velocity[:, -1]
+    vl = dynamicResponse_linear.velocity[:, -1]
 
     plt.plot(t, vl, '--', c='g', label='Velocidade Linear')
     plt.plot(t, vc, '--', c='b', label='Velocidade De Correção')
@@ -509,8 +1381,8 @@ if __name__ == '__main__':
     plt.legend()
 
     plt.figure()
-    xd = dynamicResponse_nonlinear.x[-1, :].A1
-    xl = dynamicResponse_linear.x[-1, :].A1
+    xd = dynamicResponse_nonlinear.displacement[:, -1]
+    xl = dynamicResponse_linear.displacement[:, -1]
     plt.plot(t, xl, '--', c='g', label='Deslocamento Linear')
     plt.plot(t, xd, '.-', c='r', label='Deslocamento Não Linear')
     plt.grid()
@@ -0,0 +1,470 @@
+import multiprocessing
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from copy import copy
+
+import numpy as np
+from scipy.fft import irfft
+from scipy.linalg import eigvalsh
+from .DpLinearSolver import dense, factorize, matrix_diagonal
+from .DpOutputData import OutputData
+from .DynaSolver import assemble_force_amplitude_vector, assemble_force_matrix, equivalent_linearization, \
+    harmonic_balance, steady_state_dmf
+
+# Methods whose linear time integration can be batched over all the frequencies of a sweep
+BATCHED_METHODS = ('Finite Differences Method', 'Average Acceleration Method', 'Linear Acceleration Method',
+                   'Runge-Kutta Method')
+
+
+def dmf_sweep(mass, damping, stiffness, excitation, configurations, tlcd, frequencies, progress=None):
+    """ Function that computes the maximum displacement and dynamic magnification factor of each loaded DOF for a
+    sine wave excitation at each frequency of a DMF sweep.
+
+    Linear systems get the steady-state amplitudes at all frequencies at once (when configurations.dmfMethod is
+    'Frequency Response', which also serves nonlinear systems whose configurations.nonLinearMethod is 'Equivalent
+    Linearization', with a RuntimeWarning listing the frequencies where it did not converge) or integrate all
+    frequencies at once by batched_dmf_sweep. With 'Harmonic Balance' linear and nonlinear systems get their periodic
+    steady state by harmonic_balance_dmf. Otherwise every frequency runs its own time integration, and the frequencies
+    are split in chunks solved by a pool of configurations.dmfWorkers processes, each working on its own copy of the
+    input data. With configurations.dmfWarmStart each process gets a single chunk of contiguous frequencies in
+    ascending order (the whole sweep when serial), so the warm start of dmf_sweep_chunk carries over from one
+    frequency to the next.
+
+    :param mass: np.ndarray - Mass matrix of the system.
+    :param damping: np.ndarray - Damping matrix of the system.
+    :param stiffness: np.ndarray - Stiffness matrix of the system.
+    :param excitation: object - Sine wave excitation whose frequency is swept. It is not modified.
+    :param configurations: object - Object containing the time step, the solution method and the sweep options.
+    :param tlcd: object - Data of the building tlcd.
+    :param frequencies: np.ndarray - Excitation frequencies of the sweep (rad/s).
+    :param progress: function - Called with the percentage done after each chunk of frequencies.
+    :return: tuple - Lists with the maximum displacements and DMFs of the loaded DOFs at each frequency.
+    """
+    frequencies = np.asarray(frequencies, dtype=float)
+    nonLinear = configurations.nonLinearAnalysis and (tlcd is not None)
+
+    equivalentLinear = nonLinear and configurations.nonLinearMethod == 'Equivalent Linearization'
+    if configurations.dmfMethod == 'Frequency Response' and (equivalentLinear or not nonLinear):
+        forceAmplitude = assemble_force_amplitude_vector(excitation, mass)
+        dampingDiagonal = None
+        if equivalentLinear:
+            dampingDiagonal, converged = equivalent_linearization(mass, damping, stiffness, forceAmplitude,
+                                                                  frequencies, tlcd,
+                                                                  configurations.equivalentDampingTolerance)
+            if not np.all(converged):
+                warnings.warn('The equivalent linearization did not converge at {} rad/s. The DMF there uses the '
+                              'damping of its last iteration.'.format(np.round(frequencies[~converged], 4).tolist()),
+                              RuntimeWarning)
+        displacements, dmfs = steady_state_dmf(mass, damping, stiffness, forceAmplitude, frequencies,
+                                               dampingDiagonal)
+        if progress is not None:
+            progress(100.)
+        return displacements.tolist(), dmfs.tolist()
+
+    if configurations.dmfMethod == 'Harmonic Balance':
+        return harmonic_balance_dmf(mass, damping, stiffness, excitation, configurations, tlcd if nonLinear else None,
+                                    frequencies, progress)
+
+    if not nonLinear and configurations.method in BATCHED_METHODS:
+        return batched_dmf_sweep(mass, damping, stiffness, excitation, configurations, tlcd, frequencies, progress)
+
+    workers = configurations.dmfWorkers or os.cpu_count() or 1
+    workers = min(workers, len(frequencies))
+    displacements = [None] * len(frequencies)
+    dmfs = [None] * len(frequencies)
+    done = 0
+
+    if configurations.dmfWarmStart:
+        order = np.argsort(frequencies, kind='stable')
+        chunks = [chunk.tolist() for chunk in np.array_split(order, workers) if chunk.size]
+    elif workers <= 1:
+        chunks = [[i] for i in range(len(frequencies))]
+    else:
+        # A few chunks per worker balance the load and keep the progress bar moving
+        chunks = [chunk.tolist() for chunk in np.array_split(np.arange(len(frequencies)), 4 * workers) if chunk.size]
+
+    def collect(chunk, result):
+        nonlocal done
+        for i, (displacement, dmf) in zip(chunk, zip(*result)):
+            displacements[i] = displacement
+            dmfs[i] = dmf
+        done += len(chunk)
+        if progress is not None:
+            progress(done / len(frequencies) * 100)
+
+    if workers <= 1:
+        chunkProgress = progress if len(chunks) == 1 else None
+        for chunk in chunks:
+            collect(chunk, dmf_sweep_chunk(mass, damping, stiffness, excitation, configurations, tlcd,
+                                           frequencies[chunk], chunkProgress))
+    else:
+        # The sweep runs from a Qt thread, and forking a multithreaded process may deadlock
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+            futures = {executor.submit(dmf_sweep_chunk, mass, damping, stiffness, excitation, configurations, tlcd,
+                                       frequencies[chunk]): chunk for chunk in chunks}
+            for future in as_completed(futures):
+                collect(futures[future], future.result())
+
+    return displacements, dmfs
+
+
+def adaptive_dmf_sweep(mass, damping, stiffness, excitation, configurations, tlcd, lowerFrequency, upperFrequency,
+                       progress=None):
+    """ Function that samples a DMF curve adaptively. It starts from a coarse uniform sweep plus the natural
+    frequencies of the system, so that sharp resonances are not missed between coarse points. Each round then
+    splits the intervals with the largest error, measured by how much the DMF of any DOF at their ends deviates from
+    the chord of the neighbouring frequencies (relative to its maximum). Intervals next to a peak are also split
+    until they are narrower than configurations.dmfTolerance times the frequency range. The new frequencies of each
+    round are solved together by dmf_sweep, and the sweep stops when every error is below configurations.dmfTolerance
+    or when configurations.dmfDiscretizationPoints frequencies have been solved. Intervals next to a frequency that
+    failed to converge (NaN DMF, see harmonic_balance_dmf) are not split.
+
+    :param mass: np.ndarray - Mass matrix of the system.
+    :param damping: np.ndarray - Damping matrix of the system.
+    :param stiffness: np.ndarray - Stiffness matrix of the system.
+    :param excitation: object - Sine wave excitation whose frequency is swept. It is not modified.
+    :param configurations: object - Object containing the time step, the solution method and the sweep options.
+    :param tlcd: object - Data of the building tlcd.
+    :param lowerFrequency: float - Lower frequency of the sweep (rad/s).
+    :param upperFrequency: float - Upper frequency of the sweep (rad/s).
+    :param progress: function - Called with the percentage of the maximum number of frequencies solved.
+    :return: tuple - Sorted frequencies and lists with the maximum displacements and DMFs of the loaded DOFs at each
+    frequency.
+    """
+    budget = max(configurations.dmfDiscretizationPoints, 3)
+    tolerance = configurations.dmfTolerance
+    minimumWidth = tolerance * (upperFrequency - lowerFrequency)
+    roundSize = max(budget // 8, 1)
+
+    naturalFrequencies = np.sqrt(np.absolute(eigvalsh(dense(stiffness), dense(mass))))
+    naturalFrequencies = naturalFrequencies[(naturalFrequencies > lowerFrequency) &
+                                            (naturalFrequencies < upperFrequency)]
+    frequencies = np.union1d(np.linspace(lowerFrequency, upperFrequency, max(roundSize, 3)), naturalFrequencies)
+    displacements, dmfs = dmf_sweep(mass, damping, stiffness, excitation, configurations, tlcd, frequencies)
+
+    while len(frequencies) < budget:
+        if progress is not None:
+            progress(len(frequencies) / budget * 100)
+
+        dmf = np.array(dmfs)
+        scale = np.nanmax(np.absolute(dmf), axis=0, initial=0.)
+        scale[scale == 0] = 1.
+
+        # Deviation of each interior point from the chord of its neighbours, for the worst DOF
+        weight = (frequencies[1:-1] - frequencies[:-2]) / (frequencies[2:] - frequencies[:-2])
+        chord = dmf[:-2] + weight[:, np.newaxis] * (dmf[2:] - dmf[:-2])
+        deviation = np.max(np.absolute(dmf[1:-1] - chord) / scale, axis=1)
+        peak = np.any((dmf[1:-1] >= dmf[:-2]) & (dmf[1:-1] >= dmf[2:]), axis=1)
+
+        # Error of each interval, from the points at its ends
+        width = np.diff(frequencies)
+        error = np.zeros(len(frequencies) - 1)
+        error[:-1] = np.maximum(error[:-1], deviation)
+        error[1:] = np.maximum(error[1:], deviation)
+        nearPeak = np.zeros(len(frequencies) - 1, dtype=bool)
+        nearPeak[:-1] |= peak
+        nearPeak[1:] |= peak
+        error[nearPeak] = np.maximum(error[nearPeak], 2 * tolerance)
+        error[width <= minimumWidth] = 0.
+        error[np.isnan(error)] = 0.
+
+        candidates = np.flatnonzero(error > tolerance)
+        if candidates.size == 0:
+            break
+        worst = candidates[np.argsort(error[candidates])[::-1]][:min(roundSize, budget - len(frequencies))]
+        newFrequencies = frequencies[worst] + width[worst] / 2
+
+        newDisplacements, newDmfs = dmf_sweep(mass, damping, stiffness, excitation, configurations, tlcd,
+                                              newFrequencies)
+        frequencies = np.concatenate((frequencies, newFrequencies))
+        displacements += newDisplacements
+        dmfs += newDmfs
+        order = np.argsort(frequencies, kind='stable')
+        frequencies = frequencies[order]
+        displacements = [displacements[i] for i in order]
+        dmfs = [dmfs[i] for i in order]
+
+    if progress is not None:
+        progress(100.)
+    return frequencies, displacements, dmfs
+
+
+def harmonic_balance_dmf(mass, damping, stiffness, excitation, configurations, tlcd, frequencies, progress=None):
+    """ Function that computes the steady-state maximum displacement and dynamic magnification factor of each loaded
+    DOF at each frequency of a DMF sweep by harmonic_balance, with configurations.dmfHarmonics odd harmonics.
+
+    The frequencies are solved in ascending order by natural parameter continuation: each solution starts from the
+    secant extrapolation of the two previous ones, so the Newton iterations only correct a small step. The TLCD damping
+    does not bend the response curves back (it is not a stiffness nonlinearity), so no arc-length parametrization is
+    needed to follow them. Frequencies where the iterations do not converge get NaN displacements and DMFs, with a
+    RuntimeWarning, and the continuation goes on from the last converged ones.
+
+    :param mass: np.ndarray - Mass matrix of the system.
+    :param damping: np.ndarray - Damping matrix of the system.
+    :param stiffness: np.ndarray - Stiffness matrix of the system.
+    :param excitation: object - Sine wave excitation whose frequency is swept. It is not modified.
+    :param configurations: object - Object containing the sweep options.
+    :param tlcd: object - Data of the building tlcd, whose damping is nonlinear. The system is linear if None.
+    :param frequencies: np.ndarray - Excitation frequencies of the sweep (rad/s).
+    :param progress: function - Called with the percentage done after each frequency.
+    :return: tuple - Lists with the maximum displacements and DMFs of the loaded DOFs at each frequency.
+    """
+    frequencies = np.asarray(frequencies, dtype=float)
+    forceAmplitude = assemble_force_amplitude_vector(excitation, mass)
+    loaded = forceAmplitude != 0
+    staticDisplacement = np.absolute(forceAmplitude[loaded]) / matrix_diagonal(stiffness)[loaded]
+    harmonics = configurations.dmfHarmonics
+
+    # The peak of the periodic response is taken from its samples over one period
+    numberOfSamples = 256 * harmonics
+    orders = np.arange(1, 2 * harmonics, 2)
+    spectrum = np.zeros((numberOfSamples // 2 + 1, int(np.count_nonzero(loaded))), dtype=complex)
+
+    displacements = [None] * len(frequencies)
+    dmfs = [None] * len(frequencies)
+    previous = []
+    for done, i in enumerate(np.argsort(frequencies, kind='stable')):
+        frequency = frequencies[i]
+        guess = None
+        if len(previous) == 2 and previous[1][0] != previous[0][0]:
+            (w0, x0), (w1, x1) = previous
+            guess = x1 + (x1 - x0) * (frequency - w1) / (w1 - w0)
+        elif previous:
+            guess = previous[-1][1]
+
+        try:
+            amplitudes = harmonic_balance(mass, damping, stiffness, forceAmplitude, frequency, tlcd, harmonics, guess)
+        except (ArithmeticError, np.linalg.LinAlgError) as error:
+            warnings.warn('{} The DMF at {} rad/s is left as NaN.'.format(error, frequency), RuntimeWarning)
+            displacement = np.full(staticDisplacement.shape, np.nan)
+        else:
+            previous = previous[-1:] + [(frequency, amplitudes)]
+            spectrum[orders] = amplitudes[:, loaded] * (numberOfSamples / 2)
+            displacement = np.max(np.absolute(irfft(spectrum, n=numberOfSamples, axis=0)), axis=0)
+        displacements[i] = displacement.tolist()
+        dmfs[i] = (displacement / staticDisplacement).tolist()
+        if progress is not None:
+            progress((done + 1) / len(frequencies) * 100)
+
+    return displacements, dmfs
+
+
+def dmf_sweep_chunk(mass, damping, stiffness, excitation, configurations, tlcd, frequencies, progress=None):
+    """ Function that runs the time integration of a chunk of frequencies of a DMF sweep, each one until its steady
+    state. It is the task of each process of dmf_sweep, so it only depends on its arguments.
+
+    With configurations.dmfWarmStart, each frequency starts from the steady state of the previous one instead of
+    from rest. The harmonic at the excitation frequency, x = Re(X * exp(i * w * t)), is fitted to the last steady
+    state window (which filters out the free vibration of lightly damped modes) and its displacement and velocity at
+    t = 0 start the next frequency. Its steady-state peak is passed as the initialPeak of the next run, whose first
+    window of excitation cycles then counts towards the steady state, so only a short settling is integrated.
+
+    :param mass: np.ndarray - Mass matrix of the system.
+    :param damping: np.ndarray - Damping matrix of the system.
+    :param stiffness: np.ndarray - Stiffness matrix of the system.
+    :param excitation: object - Sine wave excitation whose frequency is swept. It is not modified.
+    :param configurations: object - Object containing the time step, the solution method and the sweep options.
+    :param tlcd: object - Data of the building tlcd.
+    :param frequencies: np.ndarray - Excitation frequencies of the chunk (rad/s), preferably sorted.
+    :param progress: function - Called with the percentage of the chunk done after each frequency.
+    :return: tuple - Lists with the maximum displacements and DMFs of the loaded DOFs at each frequency.
+    """
+    excitation = copy(excitation)
+    excitation.relativeFrequency = False
+    displacements = []
+    dmfs = []
+    amplitude = None
+    peak = None
+
+    for frequency in frequencies:
+        excitation.frequencyInput = frequency
+        excitation.calc_frequency()
+
+        runConfigurations = configurations
+        if amplitude is not None:
+            runConfigurations = copy(configurations)
+            runConfigurations.initialDisplacement = amplitude.real
+            runConfigurations.initialVelocity = -frequency * amplitude.imag
+
+        force = assemble_force_matrix(excitation, mass, configurations, lazy=True)
+        outputData = OutputData(mass, damping, stiffness, force, runConfigurations, tlcd,
+                                steadyStatePeriod=2 * np.pi / frequency, initialPeak=peak)
+        displacements.append(outputData.maxDisplacement)
+        dmfs.append(outputData.DMF)
+
+        response = outputData.dynamicResponse
+        if configurations.dmfWarmStart and response.steadyStatePeak is not None:
+            window = slice(-response.cycleSteps, None)
+            phase = np.exp(-1j * frequency * np.asarray(response.t[window]))
+            amplitude = 2 * phase @ response.displacement[window] / phase.size
+            peak = response.steadyStatePeak
+        else:
+            amplitude = None
+            peak = None
+        if progress is not None:
+            progress(len(dmfs) / len(frequencies) * 100)
+
+    return displacements, dmfs
+
+
+def batched_dmf_sweep(mass, damping, stiffness, excitation, configurations, tlcd, frequencies, progress=None):
+    """ Function that integrates a linear system for all the frequencies of a DMF sweep at once. Every frequency
+    shares M, C, K and the time step, so the state is stored as DOF by frequency sized arrays and each time step is
+    one solve with many right hand sides of a single factorization. Only the running peaks of the displacement are
+    kept, each frequency stops updating them at its steady state and the integration stops when all of them reach
+    it, so they match the OutputData of each frequency run alone.
+
+    :param mass: np.ndarray - Mass matrix of the system.
+    :param damping: np.ndarray - Damping matrix of the system.
+    :param stiffness: np.ndarray - Stiffness matrix of the system.
+    :param excitation: object - Sine wave excitation whose frequency is swept. It is not modified.
+    :param configurations: object - Object containing the time step and the solution method (one of BATCHED_METHODS).
+    :param tlcd: object - Data of the building tlcd.
+    :param frequencies: np.ndarray - Excitation frequencies of the sweep (rad/s).
+    :param progress: function - Called with the percentage done along the integration.
+    :return: tuple - Lists with the maximum displacements and DMFs of the loaded DOFs at each frequency.
+    """
+    M = np.array(dense(mass))
+    C = np.array(dense(damping))
+    K = np.array(dense(stiffness))
+    frequencies = np.asarray(frequencies, dtype=float)
+    dt = configurations.timeStep
+    n = M.shape[0]
+    nf = frequencies.shape[0]
+
+    # Same sampling as assemble_force_matrix: the story forces stop at the end of the excitation and the TLCD ones
+    # last the whole analysis
+    t = np.arange(0, excitation.anlyDuration + dt, dt)
+    excitationSteps = np.arange(0, excitation.exctDuration + dt, dt).shape[0]
+    storyAmplitude = assemble_force_amplitude_vector(excitation, M)
+    tlcdAmplitude = np.zeros(n)
+    if tlcd is not None:
+        tlcdAmplitude[n - tlcd.amount:] = storyAmplitude[n - tlcd.amount:]
+        storyAmplitude[n - tlcd.amount:] = 0.
+
+    # Peak of the sampled force of each DOF, as used by OutputData.calc_dmf
+    sinePeak = np.zeros((2, nf))
+    for start in range(0, len(t), 1024):
+        sine = np.absolute(np.sin(np.outer(t[start:start + 1024], frequencies)))
+        sinePeak[1] = np.maximum(sinePeak[1], np.max(sine, axis=0))
+        if start < excitationSteps:
+            sinePeak[0] = np.maximum(sinePeak[0], np.max(sine[:excitationSteps - start], axis=0))
+    forcePeak = np.outer(np.absolute(storyAmplitude), sinePeak[0]) + np.outer(np.absolute(tlcdAmplitude), sinePeak[1])
+
+    def force(i):
+        sine = np.sin(frequencies * t[i])
+        f = np.outer(tlcdAmplitude, sine)
+        if i < excitationSteps:
+            f += np.outer(storyAmplitude, sine)
+        return f
+
+    # Each frequency stops updating its peaks at steady state, with the same windows of excitation cycles as
+    # ODESolver.steady_state_reached
+    displacementPeak = np.zeros((n, nf))
+    steadyStatePeak = np.zeros((n, nf))
+    cyclePeak = np.zeros((n, nf))
+    previousCyclePeak = np.zeros((n, nf))
+    converged = np.zeros(nf, dtype=bool)
+    tolerance = configurations.dmfSteadyStateTolerance
+    period = 2 * np.pi / frequencies
+    naturalPeriod = 2 * np.pi / np.sqrt(np.max((np.min(eigvalsh(K, M)), 1e-300)))
+    cycleSteps = np.maximum(np.ceil(np.maximum(np.ceil(naturalPeriod / period), 1) * period / dt), 1).astype(int)
+    if tolerance is not None:
+        tolerance = np.maximum(tolerance, (np.pi * dt / period) ** 2 / 2)
+
+    def update_peak(x, i):
+        np.maximum(displacementPeak, np.absolute(x), out=displacementPeak)
+        if progress is not None and i % max(len(t) // 100, 1) == 0:
+            progress(i / len(t) * 100)
+        if tolerance is None:
+            return False
+
+        np.maximum(cyclePeak, np.absolute(x), out=cyclePeak)
+        cycleEnd = (i % cycleSteps == 0) & ~converged
+        if np.any(cycleEnd):
+            check = cycleEnd & (i >= 3 * cycleSteps)
+            change = np.absolute(cyclePeak - previousCyclePeak)
+            newlyConverged = check & np.all(change <= tolerance * cyclePeak, axis=0)
+            steadyStatePeak[:, newlyConverged] = cyclePeak[:, newlyConverged]
+            converged[newlyConverged] = True
+            previousCyclePeak[:, cycleEnd] = cyclePeak[:, cycleEnd]
+            cyclePeak[:, cycleEnd] = 0.
+        return np.all(converged)
+
+    # The initial conditions (one value, or one per DOF) are the same for every frequency
+    x = np.empty((n, nf))
+    x[:] = np.reshape(np.broadcast_to(configurations.initialDisplacement, (n,)), (n, 1))
+    v = np.empty((n, nf))
+    v[:] = np.reshape(np.broadcast_to(configurations.initialVelocity, (n,)), (n, 1))
+    f = force(0)
+    a = np.linalg.solve(M, f - C @ v - K @ x)
+    update_peak(x, 0)
+
+    if configurations.method == 'Finite Differences Method':
+        alpha = M / dt ** 2 - C / (2 * dt)
+        beta = K - 2 * M / dt ** 2
+        gammaSolver = factorize(M / dt ** 2 + C / (2 * dt))
+
+        xPrevious = x - v * dt + (a * dt ** 2) / 2
+        for i in range(0, len(t) - 1):
+            if i > 0:
+                f = force(i)
+            xNext = gammaSolver.solve(f - beta @ x - alpha @ xPrevious)
+            xPrevious, x = x, xNext
+            if update_peak(x, i + 1):
+                break
+    elif configurations.method in ('Average Acceleration Method', 'Linear Acceleration Method'):
+        gamma = 1 / 2
+        beta = 1 / 4 if configurations.method == 'Average Acceleration Method' else 1 / 6
+        k_eff_solver = factorize(K + gamma / (beta * dt) * C + 1 / (beta * dt ** 2) * M)
+        a_eff = 1 / (beta * dt) * M + gamma / beta * C
+        b_eff = 1 / (2 * beta) * M + dt * ((gamma / (2 * beta)) - 1) * C
+
+        for i in range(0, len(t) - 2):
+            fNext = force(i + 1)
+            dx = k_eff_solver.solve(fNext - f + a_eff @ v + b_eff @ a)
+            x = x + dx
+            vNext = gamma / (beta * dt) * dx + (1 - gamma / beta) * v + dt * (1 - gamma / (2 * beta)) * a
+            a = 1 / (beta * dt ** 2) * dx - 1 / (beta * dt) * v + (1 - 1 / (2 * beta)) * a
+            v = vNext
+            f = fNext
+            if update_peak(x, i + 1):
+                break
+    elif configurations.method == 'Runge-Kutta Method':
+        massSolver = factorize(M)
+        A = np.zeros((2 * n, 2 * n))
+        A[:n, n:] = np.eye(n)
+        A[n:, :n] = -massSolver.solve(K)
+        A[n:, n:] = -massSolver.solve(C)
+        z = np.concatenate((x, v))
+
+        for i in range(0, len(t) - 2):
+            if i > 0:
+                f = force(i)
+            MinvF = massSolver.solve(f)
+            k1 = A @ z
+            k1[n:] += MinvF
+            k2 = A @ (z + k1 * dt / 2)
+            k2[n:] += MinvF
+            k3 = A @ (z + k2 * dt / 2)
+            k3[n:] += MinvF
+            k4 = A @ (z + k3 * dt)
+            k4[n:] += MinvF
+            z = z + (k1 + 2 * (k2 + k3) + k4) * dt / 6
+            if update_peak(z[:n], i + 1):
+                break
+
+    if progress is not None:
+        progress(100.)
+
+    # Same DMF as OutputData.calc_dmf
+    displacementPeak[:, converged] = steadyStatePeak[:, converged]
+    staticDisplacement = forcePeak / np.diagonal(K)[:, np.newaxis]
+    displacements = []
+    dmfs = []
+    for j in range(nf):
+        loaded = forcePeak[:, j] != 0
+        displacements.append(displacementPeak[loaded, j].tolist())
+        dmfs.append((displacementPeak[loaded, j] / staticDisplacement[loaded, j]).tolist())
+    return displacements, dmfs
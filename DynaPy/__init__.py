@@ -2,12 +2,17 @@ from .DpAnimationCanvas import *
 from .DpConfigurations import *
 from .DpExcitation import *
 from .DpInputData import *
+from .DpLinearSolver import *
+from .DpLowRankForce import *
 from .DpOutputData import *
 from .DpOutputDMF import *
 from .DpPltCanvas import *
+from .DpRecordCache import *
 from .DpStory import *
+from .DpStructureModel import *
 from .DpStructureCanvas import *
 from .DpTLCD import *
 from .DpTLCDCanvas import *
 from .DynaSolver import *
+from .DynaSweep import *
 from .lib import *
\ No newline at end of file
@@ -1,6 +1,15 @@
 from .DynaSolver import *
 from .DpExcitation import *
+from .DpLinearSolver import *
+from .DpRecordCache import *
+from .DpStory import *
+from .DpStructureModel import *
+from .DpTLCD import *
+from .DynaSweep import *
+from . import DynaSolver, DynaSweep
+import os
 import numpy as np
+import pytest
 
 
 def test_assemble_force_matrix():
@@ -15,6 +24,116 @@ def test_assemble_force_matrix():
     assert np.linalg.norm(foo - answer)/np.linalg.norm(answer) <= 1e-3
     # assert abs(np.max((foo-answer)/answer)) <= 1e-3
 
+def test_sine_force_matrix():
+    configurations = Configurations(timeStep=0.01)
+    tlcd = TLCD(diameter=0.3, width=5., waterHeight=0.5, amount=2, configurations=configurations)
+    M = assemble_mass_matrix({1: Story(mass=10.e3), 2: Story(mass=12.e3)}, tlcd)
+    excitation = Excitation(amplitude=2., frequency=5., exctDuration=1., anlyDuration=2., tlcd=tlcd)
+    t = configurations.timeStep * np.arange(201)
+
+    foo = assemble_force_matrix(excitation, M, configurations)
+    assert foo.shape == (4, 201)
+    assert np.allclose(foo[:2, :101], np.outer(2. * np.diag(M)[:2], np.sin(5. * t[:101])), rtol=1e-12, atol=0)
+    assert not np.any(foo[:2, 101:])
+    assert np.allclose(foo[2:], tlcd.width / tlcd.length * tlcd.mass * 2. * np.sin(5. * t), rtol=1e-12, atol=0)
+
+
+def test_general_force_matrix():
+    # Nonuniform and unsorted sampling, interpolated onto a finer grid and zero past the end of the record
+    t = [0., 0.3, 0.1, 0.7]
+    a = [0., 3., 1., -1.]
+    time = np.arange(21) / 20
+    answer = np.interp(time, [0., 0.1, 0.3, 0.7], [0., 1., 3., -1.])
+    answer[time > 0.7] = 0.
+    assert np.allclose(resample_record(t, a, time), answer, rtol=1e-12, atol=1e-12)
+    assert not np.any(resample_record(t, a, time, duration=0.5)[time > 0.5])
+
+    configurations = Configurations(timeStep=0.01)
+    tlcd = TLCD(diameter=0.3, width=5., waterHeight=0.5, amount=2, configurations=configurations)
+    M = assemble_mass_matrix({1: Story(mass=10.e3)}, tlcd)
+    t = [round(0.01 * i, 10) for i in range(200)]
+    a = list(np.sin(np.arange(200)))
+    excitation = Excitation('General Excitation', t=t, a=a, tlcd=tlcd)
+    foo = assemble_force_matrix(excitation, M, configurations)
+    assert foo.shape == (3, 200)
+    assert np.allclose(foo, np.outer(M[:, 0], a), rtol=1e-12, atol=1e-9)
+
+
+def test_lazy_force():
+    configurations = Configurations(timeStep=0.01)
+    tlcd = TLCD(diameter=0.3, width=5., waterHeight=0.5, amount=2, configurations=configurations)
+    stories = {i: Story(mass=10.e3) for i in range(1, 4)}
+    for story in stories.values():
+        story.calc_damping_coefficient(0.02)
+    M = assemble_mass_matrix(stories, tlcd)
+    C = assemble_damping_matrix(stories, tlcd)
+    K = assemble_stiffness_matrix(stories, tlcd)
+    excitation = Excitation(amplitude=2., frequency=5., exctDuration=1., anlyDuration=2., tlcd=tlcd)
+    answer = assemble_force_matrix(excitation, M, configurations)
+    foo = assemble_force_matrix(excitation, M, configurations, lazy=True)
+    assert isinstance(foo, LowRankForce) and foo.left.shape == (5, 2)
+    assert np.array_equal(np.asarray(foo), answer)
+    assert np.array_equal(foo.T[150], answer[:, 150])
+    assert np.array_equal(foo.absolute_max(chunkSize=64), np.max(np.absolute(answer), axis=1))
+
+    for method in ('Finite Differences Method', 'Average Acceleration Method', 'Runge-Kutta Method',
+                   'Matrix Exponential Method'):
+        configurations.method = method
+        denseOutput = OutputData(M, C, K, answer, configurations, tlcd)
+        lazyOutput = OutputData(M, C, K, foo, configurations, tlcd)
+        assert np.allclose(lazyOutput.dynamicResponse.displacement, denseOutput.dynamicResponse.displacement, rtol=0,
+                           atol=1e-12 * np.max(np.absolute(denseOutput.dynamicResponse.displacement)))
+        assert np.allclose(lazyOutput.DMF, denseOutput.DMF, rtol=1e-12, atol=0)
+
+
+def test_load_excitation_record(tmp_path):
+    fileName = str(tmp_path / 'record.txt')
+    with open(fileName, 'w', encoding='utf-8') as file:
+        file.write('unit: g\n3\n0, 0\n0.01, 0.25\n0.02, -0.5\n')
+
+    unit, t, a = load_excitation_record(fileName)
+    assert unit == 'g'
+    assert np.array_equal(t, [0., 0.01, 0.02]) and np.array_equal(a, [0., 0.25, -0.5])
+    assert os.path.isfile(fileName + '.npz')
+    assert np.array_equal(load_excitation_record(fileName)[2], a)
+
+    # A changed file is parsed again
+    with open(fileName, 'w', encoding='utf-8') as file:
+        file.write('unit: m/s2\n2\n0, 1\n0.5, 2\n')
+    unit, t, a = load_excitation_record(fileName)
+    assert unit == 'm/s2' and np.array_equal(a, [1., 2.])
+
+
+def test_resampled_record_cache(monkeypatch):
+    cache = RecordCache(maxBytes=2000)
+    for i in range(3):
+        cache.put(('record', i), np.full(100, float(i)))
+    assert len(cache) == 2 and cache.get(('record', 0)) is None
+    assert cache.get(('record', 1))[0] == 1. and not cache.get(('record', 1)).flags.writeable
+    cache.put(('record', 3), np.zeros(100))
+    assert cache.get(('record', 2)) is None and cache.get(('record', 1)) is not None
+    cache.resize(1000)
+    assert len(cache) == 1 and cache.nbytes == 800
+
+    configurations = Configurations(timeStep=0.01)
+    M = np.diag([10.e3, 10.e3])
+    excitation = Excitation('General Excitation', t=[0., 0.5, 1.], a=[0., 1., 0.])
+    resampledRecordCache.clear()
+    answer = assemble_force_matrix(excitation, M, configurations)
+    hits = resampledRecordCache.hits
+    foo = assemble_force_matrix(Excitation('General Excitation', t=[0., 0.5, 1.], a=[0., 1., 0.]), M, configurations)
+    assert resampledRecordCache.hits == hits + 1 and np.array_equal(foo, answer)
+    assemble_force_matrix(excitation, M, Configurations(timeStep=0.02))
+    assert len(resampledRecordCache) == 2
+
+    # The record is hashed when the excitation is created, so a hit neither hashes nor resamples it
+    calls = []
+    monkeypatch.setattr(DynaSolver, 'content_hash', lambda *args: calls.append('hash'))
+    monkeypatch.setattr(DynaSolver, 'resample_record', lambda *args: calls.append('resample'))
+    assert np.array_equal(assemble_force_matrix(excitation, M, configurations), answer)
+    assert calls == []
+
+
 def test_modal_superposition():
     answer_M = np.matrix(np.genfromtxt(r'./DynaPy/data_tests/modal_mass_matrix.csv', delimiter = '\t'))
     answer_K = np.matrix(np.genfromtxt(r'./DynaPy/data_tests/modal_stiffness_matrix.csv', delimiter = '\t'))
@@ -35,4 +154,468 @@ def test_modal_superposition():
     assert np.linalg.norm(fooM - answer_M)/np.linalg.norm(answer_M) <= 1e-3
     # assert answer_M == fooM
     # print('fooM = ', fooM, '\n')
-    # print('M = ', answer_M)
\ No newline at end of file
+    # print('M = ', answer_M)
+
+def test_ode_solver_baseline():
+    # Response of the np.matrix solver core, stacked as x, v and a of each method, linear and nonlinear. The
+    # Runge-Kutta method did not store the acceleration then, so only its initial acceleration is compared
+    answer = np.genfromtxt(r'./DynaPy/data_tests/ode_solver_response.csv', delimiter='\t')
+    methods = ['Finite Differences Method', 'Average Acceleration Method', 'Linear Acceleration Method',
+               'Runge-Kutta Method']
+    blocks = iter(np.split(answer, answer.shape[0] // 3))
+    for method in methods:
+        for nonLinearAnalysis in (False, True):
+            configurations = Configurations(method=method, timeStep=0.01, nonLinearAnalysis=nonLinearAnalysis)
+            tlcd = TLCD(diameter=0.3, width=5., waterHeight=0.5, configurations=configurations)
+            stories = {1: Story(mass=10.e3), 2: Story(mass=10.e3, tlcd=tlcd)}
+            for story in stories.values():
+                story.calc_damping_coefficient(configurations.dampingRatio)
+            M = assemble_mass_matrix(stories, tlcd)
+            C = assemble_damping_matrix(stories, tlcd)
+            K = assemble_stiffness_matrix(stories, tlcd)
+            excitation = Excitation(amplitude=1., frequency=2., exctDuration=0.25, anlyDuration=0.25, tlcd=tlcd)
+            F = assemble_force_matrix(excitation, M, configurations)
+            solver = ODESolver(M, C, K, F, configurations, tlcd)
+
+            assert solver.displacement.shape == solver.velocity.shape == solver.acceleration.shape == (26, 3)
+            assert solver.x.shape == solver.v.shape == solver.a.shape == (3, 26)
+            assert len(solver.t) == 26
+            for name, foo in zip('xva', (solver.x, solver.v, solver.a)):
+                answerBlock = next(blocks)
+                if method == 'Runge-Kutta Method' and name == 'a':
+                    assert np.allclose(foo[:, 0].T, answerBlock[:, 0])
+                else:
+                    assert np.linalg.norm(foo - answerBlock) / np.linalg.norm(answerBlock) <= 1e-8
+
+
+def test_rk4_solver():
+    # Classical RK4 on M * a = F - C * v - K * x, with the force held over each step and the TLCD damping updated
+    # from the velocity of the last DOF at the start of each step
+    def reference_rk4(M, C, K, F, dt, tlcd=None):
+        C = np.array(C)
+        n, steps = F.shape
+        x = np.zeros((steps, n))
+        v = np.zeros((steps, n))
+        a = np.zeros((steps, n))
+        tlcdDofs = np.arange(n - tlcd.amount, n) if tlcd is not None else np.arange(0)
+        for i in range(steps - 2):
+            C[tlcdDofs, tlcdDofs] = tlcd_damping_coefficient(tlcd, v[i, -1]) if tlcd is not None else 0.
+
+            def acceleration(xStage, vStage):
+                return np.linalg.solve(M, F[:, i] - C @ vStage - K @ xStage)
+
+            a[i] = acceleration(x[i], v[i])
+            x2, v2 = x[i] + dt / 2 * v[i], v[i] + dt / 2 * a[i]
+            a2 = acceleration(x2, v2)
+            x3, v3 = x[i] + dt / 2 * v2, v[i] + dt / 2 * a2
+            a3 = acceleration(x3, v3)
+            x4, v4 = x[i] + dt * v3, v[i] + dt * a3
+            a4 = acceleration(x4, v4)
+            x[i + 1] = x[i] + dt / 6 * (v[i] + 2 * v2 + 2 * v3 + v4)
+            v[i + 1] = v[i] + dt / 6 * (a[i] + 2 * a2 + 2 * a3 + a4)
+        return x, v, a
+
+    for nonLinearAnalysis in (False, True):
+        configurations = Configurations(method='Runge-Kutta Method', timeStep=0.005,
+                                        nonLinearAnalysis=nonLinearAnalysis)
+        tlcd = TLCD(diameter=0.3, width=5., waterHeight=0.5, amount=2, configurations=configurations)
+        stories = {1: Story(mass=10.e3), 2: Story(mass=12.e3), 3: Story(mass=8.e3, tlcd=tlcd)}
+        for story in stories.values():
+            story.calc_damping_coefficient(configurations.dampingRatio)
+        M = assemble_mass_matrix(stories, tlcd)
+        C = assemble_damping_matrix(stories, tlcd)
+        K = assemble_stiffness_matrix(stories, tlcd)
+        excitation = Excitation(amplitude=1., frequency=tlcd.naturalFrequency, exctDuration=2., anlyDuration=3.,
+                                tlcd=tlcd)
+        F = assemble_force_matrix(excitation, M, configurations)
+
+        solver = ODESolver(M, C, K, F, configurations, tlcd)
+        answer = reference_rk4(M, C, K, F, configurations.timeStep, tlcd if nonLinearAnalysis else None)
+        for foo, answerHistory in zip((solver.displacement, solver.velocity, solver.acceleration), answer):
+            assert np.linalg.norm(foo - answerHistory) / np.linalg.norm(answerHistory) <= 1e-10
+
+
+def test_linear_solver():
+    K = 600*np.matrix([[1, -1, 0],
+                       [-1, 3, -2],
+                       [0, -2, 5]])
+    A = K + np.matrix([[0, 0, 0],
+                       [0, 0, 0],
+                       [0, 300, 0]])
+    b = np.matrix([[1, 2, 3]]).T
+
+    solver = LinearSolver(K)
+    assert solver.method == 'Cholesky'
+    assert np.linalg.norm(solver.solve(b) - K.I * b) / np.linalg.norm(K.I * b) <= 1e-10
+
+    solver = LinearSolver(A)
+    assert solver.method == 'LU'
+    assert np.linalg.norm(solver.solve(b) - A.I * b) / np.linalg.norm(A.I * b) <= 1e-10
+
+
+def test_low_rank_update_solver():
+    A = np.matrix([[4., -1, 0, 0],
+                   [-1, 4, -1, 0.5],
+                   [0, -1, 4, 0],
+                   [0, 0.5, 0, 2]])
+    b = np.matrix([[1, 2, 3, 4]]).T
+
+    solver = LowRankUpdateSolver(A, [2, 3])
+    assert np.linalg.norm(solver.solve(b) - A.I * b) / np.linalg.norm(A.I * b) <= 1e-10
+
+    A[2, 2] = 5.
+    A[3, 3] = 7.
+    solver.update_diagonal([5., 7.])
+    assert np.linalg.norm(solver.solve(b) - A.I * b) / np.linalg.norm(A.I * b) <= 1e-10
+
+
+def test_banded_solver():
+    n = STRUCTURED_SIZE + 8
+    A = np.diag(4. * np.ones(n)) - np.diag(np.ones(n - 1), 1) - np.diag(np.ones(n - 1), -1)
+    A[n - 3:, n - 3:] = np.diag([3., 2., 2.])
+    A[n - 3, n - 2:] = 0.5
+    A[n - 2:, n - 3] = 0.5
+    b = np.arange(n, dtype=float)
+
+    assert find_bandwidth(A) == (2, 2)
+    solver = factorize(A)
+    assert isinstance(solver, BandedSolver)
+    assert np.linalg.norm(solver.solve(b) - np.linalg.solve(A, b)) / np.linalg.norm(np.linalg.solve(A, b)) <= 1e-10
+
+    operator = MatrixOperator(A)
+    assert operator.banded
+    assert np.linalg.norm(operator.dot(b, np.empty(n)) - A @ b) / np.linalg.norm(A @ b) <= 1e-10
+
+
+def test_sparse_assembly():
+    configurations = Configurations(method='Average Acceleration Method', nonLinearAnalysis=True)
+    tlcd = TLCD(diameter=0.3, width=5., waterHeight=0.5, amount=2, configurations=configurations)
+    stories = {i + 1: Story(mass=10.e3 + 100. * i, height=3. + 0.01 * i) for i in range(STRUCTURED_SIZE + 8)}
+    for story in stories.values():
+        story.calc_damping_coefficient(0.02)
+    assemblers = (assemble_mass_matrix, assemble_damping_matrix, assemble_stiffness_matrix)
+    matrices = [assemble(stories, tlcd) for assemble in assemblers]
+    sparseMatrices = [assemble(stories, tlcd, sparse=True) for assemble in assemblers]
+    for foo, answer in zip(sparseMatrices, matrices):
+        assert np.array_equal(foo.toarray(), answer)
+
+    F = np.outer(np.ones(matrices[0].shape[0]), np.sin(5. * configurations.timeStep * np.arange(200)))
+    for method in ('Average Acceleration Method', 'Finite Differences Method'):
+        configurations.method = method
+        answer = ODESolver(*matrices, F, configurations, tlcd).displacement
+        foo = ODESolver(*sparseMatrices, F, configurations, tlcd).displacement
+        assert np.linalg.norm(foo - answer) / np.linalg.norm(answer) <= 1e-10
+
+    frequencies = np.array([1., 5., 10.])
+    answer = frequency_response(*matrices, F[:, 1], frequencies)
+    foo = frequency_response(*sparseMatrices, F[:, 1], frequencies)
+    assert np.linalg.norm(foo - answer) / np.linalg.norm(answer) <= 1e-10
+
+    # Without a narrow band the sparse LU is used
+    A = sparseMatrices[2].tolil()
+    A[0, -1] = A[-1, 0] = -1.
+    solver = factorize(A.tocsc())
+    assert isinstance(solver, SparseSolver)
+    assert np.linalg.norm(solver.solve(F[:, 1]) - np.linalg.solve(A.toarray(), F[:, 1])) <= \
+        1e-10 * np.linalg.norm(np.linalg.solve(A.toarray(), F[:, 1]))
+
+
+def test_structure_model():
+    tlcd = TLCD(diameter=0.3, width=5., waterHeight=0.5, amount=2, configurations=Configurations())
+    supports = ['Fix-Fix', 'Fix-Pin', 'Pin-Fix', 'Pin-Pin', 'Fix-Fix']
+    structure = StructureModel(mass=np.linspace(10.e3, 14.e3, 5), height=[3., 3.5, 3., 4., 3.], support=supports,
+                               tlcd=tlcd)
+    structure.calc_damping_coefficient(0.02)
+    stories = {i: Story(10.e3 + 1.e3 * (i - 1), [3., 3.5, 3., 4., 3.][i - 1], support=supports[i - 1],
+                        tlcd=tlcd if i == 5 else None) for i in range(1, 6)}
+    for story in stories.values():
+        story.calc_damping_coefficient(0.02)
+
+    assert len(structure) == 5 and structure[5].tlcd is tlcd
+    for name in ('stiffness', 'naturalFrequency', 'criticalDamping', 'dampingCoefficient'):
+        answer = np.array([getattr(stories[i], name) for i in range(1, 6)])
+        assert np.allclose(getattr(structure, name), answer, rtol=1e-14, atol=0)
+        assert np.array_equal(getattr(as_structure_model(stories), name), answer)
+
+    for assemble in (assemble_mass_matrix, assemble_damping_matrix, assemble_stiffness_matrix):
+        assert np.allclose(assemble(structure, tlcd), assemble(stories, tlcd), rtol=1e-14, atol=0)
+    assert StructureModel(numberOfStories=1000).stiffness.shape == (1000,)
+
+    # Stories without a damping coefficient still assemble their mass and stiffness, but not their damping
+    stories = {1: Story(mass=10.e3), 2: Story(mass=10.e3)}
+    assert assemble_stiffness_matrix(stories, None).shape == (2, 2)
+    with pytest.raises(AttributeError, match='calc_damping_coefficient'):
+        assemble_damping_matrix(stories, None)
+
+
+def test_expm_solver():
+    # Undamped single DOF under a step force: x = (1 - cos(w * t)) for any time step
+    w = 2 * np.pi
+    F = w ** 2 * np.ones((1, 41))
+    configurations = Configurations(method='Matrix Exponential Method', timeStep=0.05)
+    solver = ODESolver(np.array([[1.]]), np.array([[0.]]), np.array([[w ** 2]]), F, configurations)
+
+    answer = 1 - np.cos(w * np.array(solver.t))
+    assert np.linalg.norm(solver.displacement[:, 0] - answer) / np.linalg.norm(answer) <= 1e-10
+
+
+def test_modal_superposition_solver():
+    M = np.diag([1., 1.5, 2.])
+    K = 600 * np.array([[1., -1, 0], [-1, 3, -2], [0, -2, 5]])
+    F = 500 * np.outer([1., 2., 2.], np.sin(10 * 0.01 * np.arange(201)))
+
+    for C in (0.01 * K, np.diag([5., 0., 0.])):
+        configurations = Configurations(method='Matrix Exponential Method', timeStep=0.01)
+        answer = ODESolver(M, C, K, F, configurations).displacement
+
+        configurations = Configurations(method='Modal Superposition Method', timeStep=0.01, modalMassParticipation=1.)
+        foo = ODESolver(M, C, K, F, configurations).displacement
+        assert np.linalg.norm(foo - answer) / np.linalg.norm(answer) <= 1e-10
+
+
+def test_frequency_domain_solver():
+    M = np.diag([1., 1.5, 2.])
+    K = 600 * np.array([[1., -1, 0], [-1, 3, -2], [0, -2, 5]])
+    C = np.diag([0.5, 0., 0.])
+    F = 500 * np.outer([1., 2., 2.], np.sin(10 * 0.001 * np.arange(3001)))
+
+    configurations = Configurations(method='Matrix Exponential Method', timeStep=0.001, initialDisplacement=0.1)
+    answer = ODESolver(M, C, K, F, configurations)
+
+    configurations = Configurations(method='Frequency Domain Method', timeStep=0.001, initialDisplacement=0.1)
+    foo = ODESolver(M, C, K, F, configurations)
+    assert np.linalg.norm(foo.displacement - answer.displacement) / np.linalg.norm(answer.displacement) <= 1e-3
+    assert np.linalg.norm(foo.acceleration - answer.acceleration) / np.linalg.norm(answer.acceleration) <= 1e-3
+
+
+def test_steady_state_dmf():
+    # Single DOF: DMF = 1 / sqrt((1 - r^2)^2 + (2 * ksi * r)^2)
+    m, k, ksi = 2., 800., 0.05
+    c = 2 * ksi * np.sqrt(k * m)
+    frequencies = np.linspace(0.1, 40, 50)
+    r = frequencies / np.sqrt(k / m)
+
+    displacement, dmf = steady_state_dmf([[m]], [[c]], [[k]], [m], frequencies)
+    answer = 1 / np.sqrt((1 - r ** 2) ** 2 + (2 * ksi * r) ** 2)
+    assert np.linalg.norm(dmf[:, 0] - answer) / np.linalg.norm(answer) <= 1e-10
+    assert np.linalg.norm(displacement[:, 0] - answer * m / k) / np.linalg.norm(answer * m / k) <= 1e-10
+
+
+def test_dmf_sweep():
+    M = np.diag([1., 1.5, 2.])
+    K = 600 * np.array([[1., -1, 0], [-1, 3, -2], [0, -2, 5]])
+    C = 0.01 * K
+    excitation = Excitation(exctDuration=1, anlyDuration=1, frequency=1.)
+    frequencies = np.linspace(1., 40., 6)
+
+    configurations = Configurations(method='Matrix Exponential Method', dmfMethod='Time History', dmfWorkers=1)
+    serial = dmf_sweep(M, C, K, excitation, configurations, None, frequencies)
+    configurations.dmfWorkers = 2
+    parallel = dmf_sweep(M, C, K, excitation, configurations, None, frequencies)
+    assert serial == parallel
+    assert len(serial[0]) == len(frequencies)
+    assert excitation.frequency == 1.
+
+    for method in BATCHED_METHODS:
+        configurations = Configurations(method=method, dmfMethod='Time History')
+        answer = np.array(dmf_sweep_chunk(M, C, K, excitation, configurations, None, frequencies))
+        foo = np.array(batched_dmf_sweep(M, C, K, excitation, configurations, None, frequencies))
+        assert np.linalg.norm(foo - answer) / np.linalg.norm(answer) <= 1e-10
+
+        # Initial conditions of each DOF, with as many frequencies as DOFs and with a different number of them
+        configurations.initialDisplacement = np.array([0.01, -0.02, 0.005])
+        configurations.initialVelocity = np.array([0., 0.1, -0.05])
+        for sweepFrequencies in (frequencies, frequencies[:3]):
+            answer = np.array(dmf_sweep_chunk(M, C, K, excitation, configurations, None, sweepFrequencies))
+            foo = np.array(batched_dmf_sweep(M, C, K, excitation, configurations, None, sweepFrequencies))
+            assert np.linalg.norm(foo - answer) / np.linalg.norm(answer) <= 1e-10
+
+
+def test_adaptive_dmf_sweep():
+    # Single DOF peak: DMF = 1 / (2 * ksi * sqrt(1 - ksi^2)) at w = wn * sqrt(1 - 2 * ksi^2)
+    m, k, ksi = 2., 800., 0.01
+    c = 2 * ksi * np.sqrt(k * m)
+    excitation = Excitation(amplitude=1.)
+    configurations = Configurations(dmfDiscretizationPoints=200, dmfAdaptive=True)
+
+    frequencies, displacements, dmfs = adaptive_dmf_sweep([[m]], [[c]], [[k]], excitation, configurations, None,
+                                                          0.1, 40.)
+    dmf = np.array(dmfs)[:, 0]
+    assert len(frequencies) < 200
+    assert np.all(np.diff(frequencies) > 0)
+    assert abs(dmf.max() * 2 * ksi * np.sqrt(1 - ksi ** 2) - 1) <= 1e-3
+    assert abs(frequencies[dmf.argmax()] / (20 * np.sqrt(1 - 2 * ksi ** 2)) - 1) <= 1e-3
+
+    # The natural frequency of the antisymmetric motion of two TLCDs is seeded and solved by Harmonic Balance
+    configurations = Configurations(nonLinearAnalysis=True, dmfMethod='Harmonic Balance', dmfAdaptive=True,
+                                    dmfDiscretizationPoints=60)
+    tlcd = TLCD(diameter=0.3, width=5., waterHeight=0.5, amount=2, configurations=configurations)
+    stories = {1: Story(mass=10.e3), 2: Story(mass=10.e3)}
+    for story in stories.values():
+        story.calc_damping_coefficient(configurations.dampingRatio)
+    M = assemble_mass_matrix(stories, tlcd)
+    C = assemble_damping_matrix(stories, tlcd)
+    K = assemble_stiffness_matrix(stories, tlcd)
+    excitation = Excitation(amplitude=0.1, tlcd=tlcd)
+    frequencies, displacements, dmfs = adaptive_dmf_sweep(M, C, K, excitation, configurations, tlcd, 0.1, 40.)
+    assert len(frequencies) == 60
+    assert np.min(np.absolute(frequencies - tlcd.naturalFrequency)) <= 1e-6
+    assert np.all(np.isfinite(dmfs))
+
+
+def test_steady_state_detection():
+    # Single DOF at steady state: x = DMF * p0 / k, with DMF = 1 / sqrt((1 - r^2)^2 + (2 * ksi * r)^2)
+    m, k, ksi, w = 2., 800., 0.05, 15.
+    c = 2 * ksi * np.sqrt(k * m)
+    configurations = Configurations(method='Average Acceleration Method', timeStep=0.001)
+    F = m * np.sin(w * configurations.timeStep * np.arange(40001))[np.newaxis, :]
+
+    solver = ODESolver([[m]], [[c]], [[k]], F, configurations, steadyStatePeriod=2 * np.pi / w)
+    r = w / np.sqrt(k / m)
+    answer = m / k / np.sqrt((1 - r ** 2) ** 2 + (2 * ksi * r) ** 2)
+    assert solver.steadyStatePeak is not None
+    assert len(solver.t) < F.shape[1] / 2
+    assert abs(solver.steadyStatePeak[0] / answer - 1) <= 1e-2
+
+
+def test_warm_start_dmf_sweep(monkeypatch):
+    M = np.diag([1., 1.5, 2.])
+    K = 600 * np.array([[1., -1, 0], [-1, 3, -2], [0, -2, 5]])
+    C = 0.02 * K
+    excitation = Excitation(exctDuration=20, anlyDuration=20, frequency=1.)
+    frequencies = np.linspace(5., 40., 36)
+    answer = np.array(steady_state_dmf(M, C, K, assemble_force_amplitude_vector(excitation, M), frequencies)[1])
+
+    # Each frequency starts from the steady state of the previous one, so fewer time steps are integrated
+    steps = []
+
+    def counted_output_data(*args, **kwargs):
+        outputData = OutputData(*args, **kwargs)
+        steps.append(len(outputData.dynamicResponse.t))
+        return outputData
+
+    monkeypatch.setattr(DynaSweep, 'OutputData', counted_output_data)
+    for dmfWarmStart in (False, True):
+        configurations = Configurations(method='Matrix Exponential Method', timeStep=0.002, dmfWorkers=1,
+                                        dmfMethod='Time History', dmfWarmStart=dmfWarmStart)
+        foo = np.array(dmf_sweep(M, C, K, excitation, configurations, None, frequencies[::-1])[1])[::-1]
+        assert np.all(np.abs(foo / answer - 1) <= 1e-2)
+    assert sum(steps[len(frequencies):]) < 0.9 * sum(steps[:len(frequencies)])
+
+    # Nonlinear TLCD: the first window of a warm-started run already counts towards its steady state
+    tlcd = TLCD(diameter=0.3, width=5., waterHeight=0.5, configurations=Configurations())
+    stories = {1: Story(tlcd=tlcd)}
+    stories[1].calc_damping_coefficient(0.02)
+    M = assemble_mass_matrix(stories, tlcd)
+    C = assemble_damping_matrix(stories, tlcd)
+    K = assemble_stiffness_matrix(stories, tlcd)
+    excitation = Excitation(exctDuration=15, anlyDuration=15, frequency=1., tlcd=tlcd)
+    frequencies = np.linspace(30., 31.25, 6)
+    configurations = Configurations(dmfMethod='Harmonic Balance')
+    answer = np.array(dmf_sweep(M, C, K, excitation, configurations, tlcd, frequencies)[1])[:, 0]
+    steps.clear()
+    for dmfWarmStart in (False, True):
+        configurations = Configurations(method='Average Acceleration Method', timeStep=0.005, dmfWorkers=1,
+                                        dmfMethod='Time History', dmfWarmStart=dmfWarmStart,
+                                        dmfSteadyStateTolerance=1e-2)
+        foo = np.array(dmf_sweep(M, C, K, excitation, configurations, tlcd, frequencies)[1])[:, 0]
+    # The warm-started story DMFs match the periodic steady state
+    assert np.all(np.abs(foo / answer - 1) <= 2e-2)
+    assert sum(steps[len(frequencies):]) < 0.8 * sum(steps[:len(frequencies)])
+
+
+def test_harmonic_balance():
+    configurations = Configurations(method='Runge-Kutta Method', nonLinearAnalysis=True)
+    tlcd = TLCD(diameter=0.3, width=5., waterHeight=0.5, amount=1, configurations=configurations)
+    coupling = tlcd.width / tlcd.length * tlcd.mass
+    M = np.array([[2000. + tlcd.mass, coupling], [coupling, tlcd.mass]])
+    K = np.diag([2e5, tlcd.stiffness])
+    C = np.diag([400., 0.])
+    p = np.array([1000., 100.])
+    w = tlcd.naturalFrequency
+
+    # Linear systems reduce to the frequency response of sin(w * t) = Re(-i * exp(i * w * t))
+    answer = frequency_response(M, C, K, -1j * p, [w])[0]
+    assert np.allclose(harmonic_balance(M, C, K, p, w)[0], answer)
+
+    # Integrating one period from the periodic steady state gets back to it
+    X = harmonic_balance(M, C, K, p, w, tlcd, harmonics=5)
+    orders = np.arange(1, 2 * X.shape[0], 2)
+    configurations.timeStep = 2 * np.pi / w / 1000
+    configurations.initialDisplacement = np.sum(X, axis=0).real
+    configurations.initialVelocity = np.sum(1j * w * orders[:, np.newaxis] * X, axis=0).real
+    F = p[:, np.newaxis] * np.sin(w * configurations.timeStep * np.arange(1002))
+    solver = ODESolver(M, C, K, F, configurations, tlcd)
+    x0 = configurations.initialDisplacement
+    assert np.linalg.norm(solver.displacement[1000] - x0) <= 1e-3 * np.linalg.norm(x0)
+
+
+def test_harmonic_balance_tlcd_modes():
+    # The antisymmetric motion of equal TLCDs is decoupled from the structure and only damped by the liquid
+    configurations = Configurations(method='Runge-Kutta Method', nonLinearAnalysis=True, dmfMethod='Harmonic Balance')
+    tlcd = TLCD(diameter=0.3, width=5., waterHeight=0.5, amount=2, configurations=configurations)
+    stories = {1: Story(mass=10.e3), 2: Story(mass=10.e3)}
+    for story in stories.values():
+        story.calc_damping_coefficient(configurations.dampingRatio)
+    M = assemble_mass_matrix(stories, tlcd)
+    C = assemble_damping_matrix(stories, tlcd)
+    K = assemble_stiffness_matrix(stories, tlcd)
+    excitation = Excitation(amplitude=0.1, tlcd=tlcd)
+    p = assemble_force_amplitude_vector(excitation, M)
+    w = tlcd.naturalFrequency
+
+    X = harmonic_balance(M, C, K, p, w, tlcd)
+    assert np.all(np.isfinite(X))
+    assert np.allclose(X[:, 2], X[:, 3])
+
+    orders = np.arange(1, 2 * X.shape[0], 2)
+    configurations.timeStep = 2 * np.pi / w / 1000
+    configurations.initialDisplacement = np.sum(X, axis=0).real
+    configurations.initialVelocity = np.sum(1j * w * orders[:, np.newaxis] * X, axis=0).real
+    F = p[:, np.newaxis] * np.sin(w * configurations.timeStep * np.arange(1002))
+    solver = ODESolver(M, C, K, F, configurations, tlcd)
+    x0 = configurations.initialDisplacement
+    assert np.linalg.norm(solver.displacement[1000] - x0) <= 1e-3 * np.linalg.norm(x0)
+
+    displacements, dmfs = harmonic_balance_dmf(M, C, K, excitation, configurations, tlcd, w * np.array([0.9, 1., 1.1]))
+    assert np.all(np.isfinite(dmfs))
+
+
+def test_equivalent_linearization(monkeypatch):
+    configurations = Configurations(method='Average Acceleration Method', nonLinearAnalysis=True,
+                                    nonLinearMethod='Equivalent Linearization')
+    tlcd = TLCD(diameter=0.3, width=5., waterHeight=0.5, amount=1, configurations=configurations)
+    coupling = tlcd.width / tlcd.length * tlcd.mass
+    M = np.array([[2000. + tlcd.mass, coupling], [coupling, tlcd.mass]])
+    K = np.diag([2e5, tlcd.stiffness])
+    C = np.diag([400., 0.])
+    p = np.array([1000., 100.])
+    frequencies = tlcd.naturalFrequency * np.array([0.5, 1., 2.])
+
+    # The energy-equivalent damping of a harmonic motion matches the one harmonic balance
+    dampingDiagonal, converged = equivalent_linearization(M, C, K, p, frequencies, tlcd, 1e-6)
+    foo = frequency_response(M, C, K, -1j * p, frequencies, dampingDiagonal=dampingDiagonal)
+    answer = np.array([harmonic_balance(M, C, K, p, w, tlcd, harmonics=1)[0] for w in frequencies])
+    assert np.all(converged)
+    assert np.linalg.norm(foo - answer) / np.linalg.norm(answer) <= 1e-3
+
+    # Sweeps warn about the frequencies that did not converge
+    configurations.dmfMethod = 'Frequency Response'
+    monkeypatch.setattr(DynaSweep, 'equivalent_linearization',
+                        lambda *args: equivalent_linearization(*args, maxIterations=2))
+    with pytest.warns(RuntimeWarning, match='did not converge'):
+        dmf_sweep(M, C, K, Excitation(amplitude=0.1, tlcd=tlcd), configurations, tlcd, frequencies)
+
+    F = p[:, np.newaxis] * np.sin(tlcd.naturalFrequency * configurations.timeStep * np.arange(2001))
+    solver = ODESolver(M, C, K, F, configurations, tlcd)
+    assert solver.equivalentDampingConverged
+    assert solver.damping[1, 1] == 0.
+
+
+def test_friction_factor():
+    tlcd = TLCD(diameter=0.3, width=5., waterHeight=0.5, configurations=Configurations())
+    velocity = np.concatenate(([0., 1e-5], np.logspace(-4, 1, 50)))
+    answer = np.array([tlcd.calculate_friction_factor(v) for v in velocity])
+    foo = tlcd.calculate_friction_factor(velocity)
+    assert answer[0] == answer[1] == 0.
+    assert np.allclose(foo, answer, rtol=1e-12, atol=0)
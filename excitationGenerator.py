@@ -1,7 +1,7 @@
 import sys
 
 import numpy as np
-from DynaPy import PltCanvas, get_text
+from DynaPy import PltCanvas, get_text, load_excitation_record
 from GUI.excitationGeneratorGUI import Ui_MainWindow
 from PyQt5.QtCore import *
 from PyQt5.QtGui import *
@@ -93,30 +93,23 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.setWindowTitle('Excitation Generator - [{}]'.format(self.fileName))
 
         try:
-            with open(self.fileName, 'r', encoding='utf-8') as file:
-                unit = file.readline()
-                if unit == 'unit: g\n':
-                    self.comboBox.setCurrentIndex(0)
-                elif unit == 'unit: m/s2\n':
-                    self.comboBox.setCurrentIndex(1)
-
-                rows = int(file.readline())
-                self.cells = []
-                for i in range(rows):
-                    cell_row = []
-                    row = file.readline()
-                    row = row.split(', ')
-                    t = row[0]
-                    a = row[1].strip('\n')
-                    x = QTableWidgetItem()
-
-                    y = QTableWidgetItem()
-                    x.setText(t)
-                    y.setText(a)
-                    self.cells.append([x, y])
-                    self.tableWidget.setItem(i, 0, x)
-                    self.tableWidget.setItem(i, 1, y)
-                    self.tableWidget.insertRow(i + 1)
+            unit, tRecord, aRecord = load_excitation_record(self.fileName)
+            if unit == 'g':
+                self.comboBox.setCurrentIndex(0)
+            elif unit == 'm/s2':
+                self.comboBox.setCurrentIndex(1)
+
+            self.cells = []
+            for i, (t, a) in enumerate(zip(tRecord.tolist(), aRecord.tolist())):
+                x = QTableWidgetItem()
+
+                y = QTableWidgetItem()
+                x.setText(str(t))
+                y.setText(str(a))
+                self.cells.append([x, y])
+                self.tableWidget.setItem(i, 0, x)
+                self.tableWidget.setItem(i, 1, y)
+                self.tableWidget.insertRow(i + 1)
 
             self.tableWidget.removeRow(i + 1)
             self.plot_excitation()
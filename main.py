@@ -7,6 +7,7 @@ It utilises PyQt5 as the GUI framework.
 This is the main script of the project and will be used to generate the .exe file for
 distribution.
 """
+import multiprocessing
 import os
 import re
 import sys
@@ -42,7 +43,7 @@ class RunSimulationThread(QThread):
         mass = assemble_mass_matrix(self.inputData.stories, self.inputData.tlcd)
         damping = assemble_damping_matrix(self.inputData.stories, self.inputData.tlcd)
         stiffness = assemble_stiffness_matrix(self.inputData.stories, self.inputData.tlcd)
-        force = assemble_force_matrix(self.inputData.excitation, mass, self.inputData.configurations)
+        force = assemble_force_matrix(self.inputData.excitation, mass, self.inputData.configurations, lazy=True)
 
         outputData_ = OutputData(mass, damping, stiffness, force, self.inputData.configurations, self.inputData.tlcd)
         self.mySignal.emit(outputData_)
@@ -58,36 +59,21 @@ class RunSetOfSimulationsThread(QThread):
         self.frequencies = frequencies
 
     def run(self):
-        displacmentList = []
-        dmfList = []
-        totalIter = len(self.frequencies)
-
-        self.mass = assemble_mass_matrix(self.inputData.stories, self.inputData.tlcd)
-        self.damping = assemble_damping_matrix(self.inputData.stories, self.inputData.tlcd)
-        self.stiffness = assemble_stiffness_matrix(self.inputData.stories, self.inputData.tlcd)
-
-        for i, j in zip(self.frequencies, range(len(self.frequencies))):
-            resp = self.simulation(self.inputData, i)
-            x = resp[0]
-            dmf = resp[1]
-            displacmentList.append(x)
-            dmfList.append(dmf)
-
-            percentageDone = (j + 1) / totalIter * 100
-            self.percentageSignal.emit(percentageDone)
+        mass = assemble_mass_matrix(self.inputData.stories, self.inputData.tlcd)
+        damping = assemble_damping_matrix(self.inputData.stories, self.inputData.tlcd)
+        stiffness = assemble_stiffness_matrix(self.inputData.stories, self.inputData.tlcd)
+
+        if self.inputData.configurations.dmfAdaptive:
+            self.frequencies, displacmentList, dmfList = adaptive_dmf_sweep(
+                mass, damping, stiffness, self.inputData.excitation, self.inputData.configurations,
+                self.inputData.tlcd, self.frequencies[0], self.frequencies[-1], progress=self.percentageSignal.emit)
+        else:
+            displacmentList, dmfList = dmf_sweep(mass, damping, stiffness, self.inputData.excitation,
+                                                 self.inputData.configurations, self.inputData.tlcd, self.frequencies,
+                                                 progress=self.percentageSignal.emit)
         signal = [self.frequencies, displacmentList, dmfList]
         self.mySignal.emit(signal)
 
-    def simulation(self, inputData_, frequency):
-        inputData_.excitation.frequencyInput = frequency
-        inputData_.excitation.relativeFrequency = False
-        inputData_.excitation.calc_frequency()
-
-        force = assemble_force_matrix(inputData_.excitation, self.mass, inputData_.configurations)
-
-        outputData_ = OutputData(self.mass, self.damping, self.stiffness, force, inputData_.configurations, inputData_.tlcd)
-        return [outputData_.maxDisplacement, outputData_.DMF]
-
 
 class MainWindow(QMainWindow, Ui_MainWindow):
     """
@@ -892,8 +878,8 @@ Preencha todos os dados e utilize o  comando "Calcular" para gerar o relatório.
             amplitude = 1
             frequency = 1
             relativeFrequency = False
-            exctDuration = 10
-            anlyDuration = 10
+            exctDuration = inputData.configurations.dmfMaxDuration
+            anlyDuration = inputData.configurations.dmfMaxDuration
 
             excitation = Excitation(exct_type, amplitude, frequency, relativeFrequency, exctDuration, anlyDuration,
                                     structure=inputData.stories, tlcd=inputData.tlcd)
@@ -1149,29 +1135,15 @@ Preencha todos os dados e utilize o  comando "Calcular" para gerar o relatório.
         elif exct_type == 'General Excitation':
             fileName = get_text(self.excitationFileLineEdit)
             try:
-                file = open(fileName, 'r')
+                unit, t, a = load_excitation_record(fileName)
             except FileNotFoundError:
                 return
-            unit = file.readline()
-            lines = int(file.readline())
-            g = inputData.configurations.gravity
-
-            t = []
-            a = []
-
-            for i in range(lines):
-                line = file.readline()
-                line = line.split(', ')
-                line[0] = float(line[0])
-                line[1] = float(line[1])
-                t.append(line[0])
-                if unit == 'unit: g\n':
-                    a.append(line[1] * g)
-                elif unit == 'unit: m/s2\n':
-                    a.append(line[1])
-
-            excitation = Excitation(exct_type, t=t, a=a, structure=inputData.stories, tlcd=inputData.tlcd,
-                                    fileName=fileName)
+            if unit == 'g':
+                a = a * inputData.configurations.gravity
+
+            # Lists are kept since the .dpfl files store the record by its repr
+            excitation = Excitation(exct_type, t=t.tolist(), a=a.tolist(), structure=inputData.stories,
+                                    tlcd=inputData.tlcd, fileName=fileName)
             inputData.excitation = excitation
 
             self.excitationWidget.excitationCanvas.plot_excitation(inputData.excitation.t_input,
@@ -1635,7 +1607,7 @@ def compare_anal_sol(case):
 
         F0 = inputData.excitation.amplitude
         omega = inputData.excitation.frequency
-        F = np.mat([[F0 * M[i, i]] for i in range(len(M[0, :].A1))])
+        F = np.mat([[F0 * M[i, i]] for i in range(M.shape[0])])
 
         t_lim = inputData.excitation.anlyDuration
 
@@ -1690,5 +1662,7 @@ def compare_anal_sol(case):
 
 
 if __name__ == '__main__':
+    # The DMF sweep starts worker processes, which need this in the frozen executable
+    multiprocessing.freeze_support()
     main()
 